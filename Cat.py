@@ -1,17 +1,35 @@
+import time
+_START_TIME = time.perf_counter()  # Раньше остальных импортов: время запуска включает и их
 import pygame
 import random
 import sys
 import math
+import os
+import bisect
+import json
+import zlib
+import queue
+import threading
+import weakref
+import gc
+import functools
+import socket
+import struct
+import argparse
+import io
+import numpy as np
+from collections import deque
 from enum import Enum, auto
-from typing import List, Dict, Optional, Callable
+from typing import List, Dict, Optional, Callable, Tuple, NamedTuple, TYPE_CHECKING
 from pygame.locals import (
-    K_a, K_d, K_w, K_SPACE, K_ESCAPE, K_r,
-    QUIT, MOUSEBUTTONDOWN
+    K_a, K_d, K_w, K_SPACE, K_ESCAPE, K_r, K_F3, K_F9, K_F10, K_F12,
+    QUIT, KEYDOWN, MOUSEBUTTONDOWN
 )
 
-# Инициализация Pygame
-pygame.init()
-pygame.mixer.init()
+if TYPE_CHECKING:
+    # Нужны только для аннотаций; в игре импортируются там, где используются
+    import cProfile
+    import sqlite3
 
 # Константы
 SCREEN_WIDTH, SCREEN_HEIGHT = 1024, 768
@@ -32,6 +50,79 @@ INVINCIBILITY_DURATION = 45
 ATTACK_COOLDOWN = 20
 PLAYER_HEALTH = 100
 ENEMY_HEALTH = 50  # Изменено для баланса
+FAST_FORWARD_STEP = 4.0  # Шаг симуляции (в тиках) при перемотке без отрисовки
+
+# Темп кадров: "tick" (clock.tick), "precise" (sleep + добивка ожиданием), "busy" (активное ожидание)
+FRAME_PACING = "precise"
+BUSY_WAIT_MARGIN = 0.002  # Последние 2 мс до дедлайна ждём активно
+LATENCY_HISTORY = 600  # Сколько последних замеров задержки ввода хранить
+LATENCY_LOG = None  # Путь к CSV с задержками ввода при выходе (None — не сохранять)
+
+# Звук
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SOUND_CACHE_DIR = os.path.join(BASE_DIR, "cache", "sounds")
+SOUND_CHANNELS = 8  # Зарезервированные каналы под эффекты
+SOUND_VOLUME = 0.4
+
+# Частицы
+PARTICLE_CAPACITY = 32768
+PARTICLE_GRAVITY = 0.25
+
+# Адаптивное качество
+QUALITY_WINDOW = 30  # Кадров в скользящем окне
+QUALITY_DOWN_RATIO = 0.9  # Среднее время кадра выше 90% бюджета — понижаем качество
+QUALITY_UP_RATIO = 0.5  # Ниже 50% бюджета...
+QUALITY_UP_DELAY = 180  # ...столько кадров подряд — повышаем обратно
+QUALITY_COOLDOWN = 60  # Пауза после любой смены уровня
+
+# Навигация врагов
+NAV_LAUNCH_STEP = 40  # Шаг перебора точек прыжка вдоль платформы
+NAV_STAND_TOLERANCE = 8  # Насколько низ может отходить от верха платформы, считаясь "стоит"
+
+# Волны врагов
+WAVE_BASE_BUDGET = 8  # Врагов в первой волне
+WAVE_BUDGET_GROWTH = 3  # Прибавка за каждую следующую волну
+SPAWN_INTERVAL = 20  # Тиков между появлениями в первой волне
+SPAWN_INTERVAL_MIN = 8
+WAVE_DELAY = 180  # Передышка между волнами
+
+# Сетевая игра
+NET_PORT = 47800
+NET_SNAPSHOT_HISTORY = 64  # Сколько отправленных/принятых снимков хранить для дельт
+NET_INPUT_REDUNDANCY = 8  # Клиент повторяет последние N вводов в каждом пакете
+NET_INPUT_BUFFER = 6  # Если на хосте скопилось больше вводов — догоняем
+NET_STATS_WINDOW = 120  # Тиков в окне статистики
+NET_FULL_SAMPLE_INTERVAL = 30  # Раз во сколько тиков мерить размер полного снимка для сравнения
+NET_HELLO_INTERVAL = 0.5
+NET_CLIENT_TIMEOUT = 5.0  # Молчащего дольше клиента может сменить новый
+
+# Профилирование по F9
+PROFILE_DIR = os.path.join(BASE_DIR, "profiles")
+PROFILE_FRAMES = 300  # Сколько кадров захватывать
+PROFILE_TOP = 40  # Строк в текстовой сводке
+
+# Скриншоты (F12) и запись геймплея (F10)
+CAPTURE_DIR = os.path.join(BASE_DIR, "captures")
+CAPTURE_BUFFERS = 8  # Кадров в пуле; нет свободного — кадр пропускается
+CAPTURE_FRAME_STEP = 2  # Писать каждый N-й кадр ролика (30 к/с при 60 FPS)
+CAPTURE_COMPRESSION = 1  # Уровень zlib для PNG: быстрее кодировать, чем экономить место
+
+# Журнал игровых событий для аналитики
+ANALYTICS_ENABLED = False  # Включается флагом --analytics
+ANALYTICS_DIR = os.path.join(BASE_DIR, "analytics")
+ANALYTICS_BATCH = 4096  # Записей в одном сбрасываемом блоке
+
+# Печатать отчёт о времени запуска после первого кадра
+STARTUP_REPORT = False
+
+# Учёт памяти поверхностей
+SURFACE_DEBUG = False  # Искать утечки: сравнивать число поверхностей при смене состояний
+SURFACE_LEAK_STREAK = 3  # Сколько переходов подряд с ростом считать утечкой
+
+# Таблица рекордов
+LEADERBOARD_PATH = os.path.join(BASE_DIR, "data", "leaderboard.db")
+LEADERBOARD_SIZE = 10
+LEADERBOARD_BATCH = 32  # Максимум записей в одной транзакции
 
 # Цвета
 BLACK = (0, 0, 0, 0)
@@ -50,6 +141,248 @@ TITLE_COLOR = (240, 240, 100)
 TITLE_SHADOW = (100, 100, 0)
 TEXT_COLOR = (220, 220, 220)
 
+# Подсистемы pygame поднимаем по требованию, а не все сразу через pygame.init()
+SUBSYSTEMS = {
+    "display": pygame.display,
+    "font": pygame.font,
+    "mixer": pygame.mixer,
+    "joystick": pygame.joystick,
+}
+
+def get_ticks() -> int:
+    # Миллисекунды с запуска; get_ticks() без pygame.init() всегда 0
+    return int((time.perf_counter() - _START_TIME) * 1000)
+
+def init_subsystem(name: str) -> bool:
+    module = SUBSYSTEMS[name]
+    if module.get_init():
+        return True
+    try:
+        module.init()
+    except pygame.error:
+        return False  # Например, нет звукового устройства
+    return bool(module.get_init())
+
+@functools.lru_cache(maxsize=None)
+def get_font(name: str, size: int, bold: bool = False) -> pygame.font.Font:
+    # Поиск системного шрифта дорогой — делаем его один раз на сочетание
+    init_subsystem("font")
+    return pygame.font.SysFont(name, size, bold=bold)
+
+class StartupTimer:
+    def __init__(self):
+        # Отсчёт от загрузки модуля: импорт numpy и pygame — заметная часть запуска
+        self.start = _START_TIME
+        self._last = self.start
+        self.phases: List[Tuple[str, float]] = []
+        self.mark("import")
+        self.time_to_first_frame: Optional[float] = None
+    
+    def mark(self, phase: str) -> None:
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+    
+    def first_frame(self) -> None:
+        if self.time_to_first_frame is not None:
+            return
+        self.mark("first_frame")
+        self.time_to_first_frame = self._last - self.start
+        if STARTUP_REPORT:
+            print("\n".join(self.report()), file=sys.stderr)
+    
+    def report(self) -> List[str]:
+        lines = [f"  {phase}: {duration * 1000:.1f} мс" for phase, duration in self.phases]
+        total = self.time_to_first_frame
+        if total is None:
+            total = self._last - self.start
+        return [f"Запуск: {total * 1000:.1f} мс до первого кадра"] + lines
+
+class SurfaceTracker:
+    LIVE_CATEGORIES = ("animation", "background", "overlay", "text")
+    # Текст и затемнения, которые рисуются заново каждый кадр: только счёт за кадр,
+    # без weakref.finalize — он стоит столько же, сколько сам font.render
+    TRANSIENT = "transient"
+    CATEGORIES = LIVE_CATEGORIES + (TRANSIENT,)
+    
+    def __init__(self, debug: bool = SURFACE_DEBUG):
+        self.debug = debug
+        self.live_count = {c: 0 for c in self.CATEGORIES}
+        self.live_bytes = {c: 0 for c in self.CATEGORIES}
+        self.peak_count = {c: 0 for c in self.CATEGORIES}
+        self.peak_bytes = {c: 0 for c in self.CATEGORIES}
+        self.peak_total_bytes = 0
+        self.frame_count = 0
+        self.frame_bytes = 0
+        self.leaks: List[str] = []
+        # Сравниваем с прошлым заходом в то же состояние, чтобы ловить рост за цикл
+        self._last_counts: Dict[str, Dict[str, int]] = {}
+        self._growth: Dict[str, Dict[str, int]] = {}
+    
+    @property
+    def total_bytes(self) -> int:
+        return sum(self.live_bytes[c] for c in self.LIVE_CATEGORIES)
+    
+    def track(self, surface: pygame.Surface, category: str) -> pygame.Surface:
+        size = surface.get_pitch() * surface.get_height()
+        if category == self.TRANSIENT:
+            self.frame_count += 1
+            self.frame_bytes += size
+            return surface
+        self.live_count[category] += 1
+        self.live_bytes[category] += size
+        if self.live_count[category] > self.peak_count[category]:
+            self.peak_count[category] = self.live_count[category]
+        if self.live_bytes[category] > self.peak_bytes[category]:
+            self.peak_bytes[category] = self.live_bytes[category]
+        total = self.total_bytes
+        if total > self.peak_total_bytes:
+            self.peak_total_bytes = total
+        # Счётчик уменьшится, когда поверхность соберёт сборщик
+        weakref.finalize(surface, self._release, category, size)
+        return surface
+    
+    def _release(self, category: str, size: int) -> None:
+        self.live_count[category] -= 1
+        self.live_bytes[category] -= size
+    
+    def end_frame(self) -> None:
+        # Временные поверхности кадра: показываем последний кадр и пик
+        category = self.TRANSIENT
+        self.live_count[category], self.live_bytes[category] = self.frame_count, self.frame_bytes
+        self.peak_count[category] = max(self.peak_count[category], self.frame_count)
+        self.peak_bytes[category] = max(self.peak_bytes[category], self.frame_bytes)
+        self.frame_count = self.frame_bytes = 0
+    
+    def snapshot(self, label: str) -> None:
+        # Вызывается при смене состояния игры; в обычном режиме ничего не делает
+        if not self.debug:
+            return
+        gc.collect()
+        counts = dict(self.live_count)
+        last = self._last_counts.get(label)
+        growth = self._growth.setdefault(label, {c: 0 for c in self.LIVE_CATEGORIES})
+        if last is not None:
+            for category in self.LIVE_CATEGORIES:
+                if counts[category] > last[category]:
+                    growth[category] += 1
+                    if growth[category] == SURFACE_LEAK_STREAK:
+                        message = (f"Возможная утечка поверхностей '{category}': "
+                                   f"{counts[category]} шт. в {label}")
+                        self.leaks.append(message)
+                        print(message, file=sys.stderr)
+                else:
+                    growth[category] = 0
+        self._last_counts[label] = counts
+    
+    def report(self) -> List[str]:
+        lines = [f"Поверхности: {self.total_bytes / 2 ** 20:.1f} МБ "
+                 f"(пик {self.peak_total_bytes / 2 ** 20:.1f} МБ)"]
+        for category in self.CATEGORIES:
+            per_frame = "/кадр" if category == self.TRANSIENT else ""
+            lines.append(f"  {category}: {self.live_count[category]} шт.{per_frame}, "
+                         f"{self.live_bytes[category] / 1024:.0f} КБ "
+                         f"(пик {self.peak_count[category]} шт., {self.peak_bytes[category] / 1024:.0f} КБ)")
+        return lines
+
+surface_tracker = SurfaceTracker()
+
+class EventLog:
+    SPAWN, HIT, DAMAGE, DEATH, STATE, FRAME = range(6)
+    KINDS = ("spawn", "hit", "damage", "death", "state", "frame")
+    # Запись фиксированного размера; в файле хранится поколоночно блоками
+    RECORD = np.dtype([("t", "<i8"), ("kind", "u1"), ("a", "<f4"), ("b", "<f4")])
+    MAGIC = b"KCEV1\n"
+    
+    def __init__(self):
+        self.records: List[tuple] = []
+        self.path: Optional[str] = None
+        self.queue: Optional["queue.Queue[Optional[List[tuple]]]"] = None
+        self.thread: Optional[threading.Thread] = None
+        self.active = False
+        self.t0 = time.perf_counter_ns()
+    
+    def log(self, kind: int, a: float = 0.0, b: float = 0.0) -> None:
+        # Горячий путь: только добавление кортежа в список; без сеанса ничего не копим
+        if self.active:
+            self.records.append((time.perf_counter_ns(), kind, a, b))
+    
+    def start(self, directory: str = ANALYTICS_DIR) -> None:
+        if self.thread is not None:
+            return
+        self.t0 = time.perf_counter_ns()
+        self.records.clear()
+        self.path = os.path.join(directory, time.strftime("session_%Y%m%d_%H%M%S.kcev"))
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._worker, args=(self.t0,), name="analytics", daemon=True)
+        self.thread.start()
+        self.active = True
+    
+    def flush(self, force: bool = False) -> None:
+        # Раз в кадр: полный буфер уходит фоновому потоку целиком
+        if len(self.records) < ANALYTICS_BATCH and not force:
+            return
+        batch, self.records = self.records, []
+        if self.queue is not None and batch:
+            self.queue.put(batch)
+    
+    def close(self, timeout: float = 2.0) -> None:
+        if self.thread is None:
+            return
+        self.active = False
+        self.flush(force=True)
+        self.queue.put(None)
+        self.thread.join(timeout)
+        self.thread = None
+    
+    def _worker(self, t0: int) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            f = open(self.path, "wb")
+        except OSError:
+            # Писать некуда — просто выбрасываем блоки
+            while self.queue.get() is not None:
+                pass
+            return
+        with f:
+            f.write(self.MAGIC)
+            while True:
+                batch = self.queue.get()
+                if batch is None:
+                    break
+                records = np.array(batch, dtype=self.RECORD)
+                records["t"] -= t0
+                f.write(struct.pack("<I", len(records)))
+                for name in self.RECORD.names:
+                    f.write(records[name].tobytes())
+                f.flush()
+    
+    @classmethod
+    def load_session(cls, path: str) -> Dict[str, np.ndarray]:
+        # Весь сеанс в массивы NumPy: t (секунды от начала), kind, a, b
+        with open(path, "rb") as f:
+            data = f.read()
+        if not data.startswith(cls.MAGIC):
+            raise ValueError(f"{path}: не файл журнала событий")
+        columns: Dict[str, List[np.ndarray]] = {name: [] for name in cls.RECORD.names}
+        offset = len(cls.MAGIC)
+        chunk_size = sum(cls.RECORD[name].itemsize for name in cls.RECORD.names)
+        while offset + 4 <= len(data):
+            count, = struct.unpack_from("<I", data, offset)
+            if offset + 4 + count * chunk_size > len(data):
+                break  # Недописанный последний блок
+            offset += 4
+            for name in cls.RECORD.names:
+                dtype = cls.RECORD[name]
+                columns[name].append(np.frombuffer(data, dtype, count, offset))
+                offset += count * dtype.itemsize
+        session = {name: np.concatenate(parts) if parts else np.empty(0, cls.RECORD[name])
+                   for name, parts in columns.items()}
+        session["t"] = session["t"] / 1e9
+        return session
+
+event_log = EventLog()
+
 class GameState(Enum):
     MAIN_MENU = auto()
     SETTINGS = auto()
@@ -57,6 +390,7 @@ class GameState(Enum):
     PLAYING = auto()
     GAME_OVER = auto()
     PAUSE = auto()
+    LEADERBOARD = auto()
 
 class PlayerState(Enum):
     IDLE = auto()
@@ -73,7 +407,7 @@ class Button:
         self.text = text
         self.action = action
         self.is_hovered = False
-        self.font = pygame.font.SysFont('Arial', font_size, bold=True)
+        self.font = get_font('Arial', font_size, bold=True)
         self.normal_color = BUTTON_COLOR
         self.hover_color = BUTTON_HOVER_COLOR
     
@@ -82,7 +416,7 @@ class Button:
         pygame.draw.rect(surface, color, self.rect, border_radius=10)
         pygame.draw.rect(surface, WHITE, self.rect, 2, border_radius=10)
         
-        text_surf = self.font.render(self.text, True, WHITE)
+        text_surf = surface_tracker.track(self.font.render(self.text, True, WHITE), "transient")
         text_rect = text_surf.get_rect(center=self.rect.center)
         surface.blit(text_surf, text_rect)
     
@@ -95,58 +429,102 @@ class Button:
             return self.action
         return None
 
+class AnimationClock:
+    # Часы анимаций одной игры: продвигаются один раз за тик симуляции
+    def __init__(self):
+        self.tick = 0.0
+    
+    def advance(self, dt: float = 1.0) -> None:
+        self.tick += dt
+
 class Animation:
+    # Только таблица кадров: номер кадра считается от часов игры, состояния нет
     def __init__(self, frames: List[pygame.Surface], speed: float = 0.2, loop: bool = True):
         self.frames = frames
         self.speed = speed
         self.loop = loop
-        self.frame_index = 0.0
-        self.done = False
+        self.flipped: Optional[List[pygame.Surface]] = None
     
-    def update(self) -> None:
-        if not self.done:
-            self.frame_index += self.speed
-            if self.loop:
-                self.frame_index %= len(self.frames)
-            elif self.frame_index >= len(self.frames):
-                self.frame_index = len(self.frames) - 1
-                self.done = True
+    def frame_at(self, tick: float, start: float = 0.0, phase: float = 0.0) -> int:
+        if self.loop:
+            return int(tick * self.speed + phase) % len(self.frames)
+        return min(int((tick - start) * self.speed), len(self.frames) - 1)
     
-    def get_current_frame(self) -> pygame.Surface:
-        return self.frames[int(self.frame_index)]
+    def is_done(self, tick: float, start: float) -> bool:
+        return not self.loop and (tick - start) * self.speed >= len(self.frames)
     
-    def reset(self) -> None:
-        self.frame_index = 0.0
-        self.done = False
+    def get_frame(self, index: int, flipped: bool = False) -> pygame.Surface:
+        if not flipped:
+            return self.frames[index]
+        # Отражённые кадры строятся один раз, а не каждый тик
+        if self.flipped is None:
+            self.flipped = [surface_tracker.track(pygame.transform.flip(frame, True, False), "animation")
+                            for frame in self.frames]
+        return self.flipped[index]
 
 class Entity(pygame.sprite.Sprite):
-    def __init__(self, x: int, y: int, width: int, height: int):
+    def __init__(self, x: int, y: int, width: int, height: int, clock: Optional[AnimationClock] = None):
         super().__init__()
-        self.image = pygame.Surface((width, height), pygame.SRCALPHA)
+        self.clock = clock if clock is not None else AnimationClock()
+        self.image = surface_tracker.track(pygame.Surface((width, height), pygame.SRCALPHA), "animation")
         self.rect = self.image.get_rect(center=(x, y))
         self.velocity_y = 0.0
         self.on_ground = False
+        self.platform = None  # Последняя платформа, на которую приземлились
+        self.prev_bottom = self.rect.bottom  # Низ до шага гравитации — для непрерывной проверки
+        self.anim_phase = 0.0  # Сдвиг фазы циклической анимации
+        self.frame_key: Optional[tuple] = None
+    
+    def show_frame(self, animation: Animation, start: float = 0.0, flipped: bool = False) -> None:
+        index = animation.frame_at(self.clock.tick, start, self.anim_phase)
+        key = (animation, index, flipped)
+        # Кадр не сменился — картинку не трогаем
+        if key != self.frame_key:
+            self.frame_key = key
+            self.image = animation.get_frame(index, flipped)
     
-    def apply_gravity(self) -> None:
-        self.velocity_y += GRAVITY
-        self.rect.y += self.velocity_y
+    def apply_gravity(self, dt: float = 1.0) -> None:
+        # Точная сумма dt единичных шагов: v += g; y += v
+        self.prev_bottom = self.rect.bottom
+        self.rect.y += self.velocity_y * dt + GRAVITY * dt * (dt + 1) / 2
+        self.velocity_y += GRAVITY * dt
     
     def check_platform_collision(self, platforms: pygame.sprite.Group) -> None:
+        # Непрерывная проверка: ищем самый ранний верх платформы на отрезке
+        # движения низа за шаг, чтобы быстрое падение не проскакивало платформу
         self.on_ground = False
+        if self.velocity_y <= 0:
+            return
+        prev_bottom = self.prev_bottom
+        landing = None
         for platform in platforms:
-            if (self.rect.colliderect(platform.rect) and 
-                self.velocity_y > 0 and 
-                self.rect.bottom > platform.rect.top + 5):
-                self.rect.bottom = platform.rect.top
-                self.velocity_y = 0
-                self.on_ground = True
+            if (self.rect.right > platform.rect.left and
+                self.rect.left < platform.rect.right and
+                prev_bottom <= platform.rect.bottom and
+                self.rect.bottom >= platform.rect.top and
+                (landing is None or platform.rect.top < landing.rect.top)):
+                landing = platform
+        if landing is not None:
+            self.rect.bottom = landing.rect.top
+            self.velocity_y = 0
+            self.on_ground = True
+            self.platform = landing
+    
+    def is_standing(self) -> bool:
+        return (self.platform is not None and self.velocity_y >= 0 and
+                abs(self.rect.bottom - self.platform.rect.top) <= NAV_STAND_TOLERANCE and
+                self.rect.right > self.platform.rect.left and
+                self.rect.left < self.platform.rect.right)
 
 class Player(Entity):
-    def __init__(self, x: int, y: int):
-        super().__init__(x, y, 70, 80)
+    def __init__(self, x: int, y: int, sounds: Optional["SoundBank"] = None,
+                 particles: Optional["ParticleSystem"] = None, clock: Optional[AnimationClock] = None):
+        super().__init__(x, y, 70, 80, clock)
+        self.sounds = sounds
+        self.particles = particles
         self.animations = self._create_animations()
+        self.anim_starts = {state: 0.0 for state in self.animations}  # Тик запуска разовых анимаций
         self.current_state = PlayerState.IDLE
-        self.image = self.animations[self.current_state].get_current_frame()
         self.health = PLAYER_HEALTH
         self.max_health = PLAYER_HEALTH
         self.attack_cooldown = 0
@@ -155,7 +533,7 @@ class Player(Entity):
         self.is_attacking = False
         self.invincible = 0
         self.hurt_timer = 0
-        self.dance_timer = 0
+        self.update_image()
     
     def _create_animations(self) -> Dict[PlayerState, Animation]:
         return {
@@ -170,7 +548,7 @@ class Player(Entity):
     def _create_idle_animation(self) -> Animation:
         frames = []
         for i in range(4):
-            frame = pygame.Surface((70, 80), pygame.SRCALPHA)
+            frame = surface_tracker.track(pygame.Surface((70, 80), pygame.SRCALPHA), "animation")
             # Тело
             pygame.draw.ellipse(frame, (220, 180, 110), (15, 30, 50, 40))
             # Голова
@@ -197,7 +575,7 @@ class Player(Entity):
     def _create_walk_animation(self) -> Animation:
         frames = []
         for i in range(6):
-            frame = pygame.Surface((70, 80), pygame.SRCALPHA)
+            frame = surface_tracker.track(pygame.Surface((70, 80), pygame.SRCALPHA), "animation")
             # Тело с анимацией ходьбы
             body_offset = 5 * math.sin(i * math.pi / 3)
             pygame.draw.ellipse(frame, (220, 180, 110), 
@@ -237,7 +615,7 @@ class Player(Entity):
         return Animation(frames, 0.2)
     
     def _create_jump_animation(self) -> Animation:
-        frame = pygame.Surface((70, 80), pygame.SRCALPHA)
+        frame = surface_tracker.track(pygame.Surface((70, 80), pygame.SRCALPHA), "animation")
         # Тело в прыжке
         pygame.draw.ellipse(frame, (220, 180, 110), (15, 25, 50, 45))
         # Голова
@@ -262,7 +640,7 @@ class Player(Entity):
     def _create_attack_animation(self) -> Animation:
         frames = []
         for i in range(5):
-            frame = pygame.Surface((90, 80), pygame.SRCALPHA)
+            frame = surface_tracker.track(pygame.Surface((90, 80), pygame.SRCALPHA), "animation")
             # Тело в атаке
             body_offset = 10 * (i / 4)
             pygame.draw.ellipse(frame, (220, 180, 110), 
@@ -298,7 +676,7 @@ class Player(Entity):
     def _create_hurt_animation(self) -> Animation:
         frames = []
         for i in range(4):
-            frame = pygame.Surface((70, 80), pygame.SRCALPHA)
+            frame = surface_tracker.track(pygame.Surface((70, 80), pygame.SRCALPHA), "animation")
             # Тело
             pygame.draw.ellipse(frame, (220, 180, 110), (15, 30, 50, 40))
             # Голова (наклонена)
@@ -329,7 +707,7 @@ class Player(Entity):
     def _create_dance_animation(self) -> Animation:
         frames = []
         for i in range(8):
-            frame = pygame.Surface((90, 100), pygame.SRCALPHA)
+            frame = surface_tracker.track(pygame.Surface((90, 100), pygame.SRCALPHA), "animation")
             
             # Тело с анимацией танца
             body_offset = 8 * math.sin(i * math.pi / 4)
@@ -364,25 +742,28 @@ class Player(Entity):
             frames.append(frame)
         return Animation(frames, 0.15)
     
+    def start_animation(self, state: PlayerState) -> None:
+        self.anim_starts[state] = self.clock.tick
+    
+    def animation_done(self, state: PlayerState) -> bool:
+        return self.animations[state].is_done(self.clock.tick, self.anim_starts[state])
+    
+    def update_image(self) -> None:
+        state = self.current_state
+        self.show_frame(self.animations[state], self.anim_starts[state], not self.facing_right)
+    
     def update_dance(self) -> None:
         self.current_state = PlayerState.DANCING
-        self.animations[self.current_state].update()
-        self.image = self.animations[self.current_state].get_current_frame()
-        
         # Периодически меняем направление
-        self.dance_timer += 1
-        if self.dance_timer >= 90:
-            self.dance_timer = 0
-            self.facing_right = not self.facing_right
-        
-        if not self.facing_right:
-            self.image = pygame.transform.flip(self.image, True, False)
+        self.facing_right = int(self.clock.tick // 90) % 2 == 0
+        self.update_image()
     
-    def update(self, platforms: pygame.sprite.Group) -> None:
-        keys = pygame.key.get_pressed()
+    def update(self, platforms: pygame.sprite.Group, keys=None, dt: float = 1.0) -> None:
+        if keys is None:
+            keys = pygame.key.get_pressed()
         
         # Горизонтальное движение
-        move_x = (keys[K_d] - keys[K_a]) * self.speed
+        move_x = (keys[K_d] - keys[K_a]) * self.speed * dt
         if move_x > 0:
             self.facing_right = True
         elif move_x < 0:
@@ -395,22 +776,24 @@ class Player(Entity):
         self.rect.x = max(20, min(self.rect.x, SCREEN_WIDTH - self.rect.width - 20))
         
         # Гравитация и коллизии
-        self.apply_gravity()
+        self.apply_gravity(dt)
         self.check_platform_collision(platforms)
 
         # Прыжок
         if keys[K_w] and self.on_ground and self.current_state != PlayerState.HURT:
             self.velocity_y = JUMP_STRENGTH
             self.current_state = PlayerState.JUMPING
-            self.animations[PlayerState.JUMPING].reset()
+            self.start_animation(PlayerState.JUMPING)
+            if self.sounds:
+                self.sounds.play("jump")
         
         # Определение состояния
         if self.current_state == PlayerState.HURT:
-            if self.animations[PlayerState.HURT].done:
+            if self.animation_done(PlayerState.HURT):
                 self.current_state = PlayerState.IDLE
         elif self.is_attacking:
             self.current_state = PlayerState.ATTACKING
-            if self.animations[PlayerState.ATTACKING].done:
+            if self.animation_done(PlayerState.ATTACKING):
                 self.is_attacking = False
         elif not self.on_ground:
             self.current_state = PlayerState.JUMPING
@@ -419,29 +802,21 @@ class Player(Entity):
         else:
             self.current_state = PlayerState.IDLE
         
-        # Обновление анимации
-        self.animations[self.current_state].update()
-        self.image = self.animations[self.current_state].get_current_frame()
-        
-        # Отражаем изображение если нужно
-        if not self.facing_right:
-            self.image = pygame.transform.flip(self.image, True, False)
-        
         # КД атаки и неуязвимости
         if self.attack_cooldown > 0:
-            self.attack_cooldown -= 1
+            self.attack_cooldown = max(0, self.attack_cooldown - dt)
         if self.invincible > 0:
-            self.invincible -= 1
+            self.invincible = max(0, self.invincible - dt)
         
         # Таймер получения урона
         if self.hurt_timer > 0:
-            self.hurt_timer -= 1
+            self.hurt_timer = max(0, self.hurt_timer - dt)
     
     def attack(self, enemies: pygame.sprite.Group) -> int:
         if self.attack_cooldown == 0 and not self.is_attacking:
             self.is_attacking = True
             self.attack_cooldown = ATTACK_COOLDOWN
-            self.animations[PlayerState.ATTACKING].reset()
+            self.start_animation(PlayerState.ATTACKING)
             
             # Создаем хитбокс атаки
             attack_rect = pygame.Rect(0, 0, SWORD_RANGE * 1.5, 60)
@@ -451,12 +826,18 @@ class Player(Entity):
                 attack_rect.midright = self.rect.midleft
                 attack_rect.x -= 20
             
-            # Проверка попадания по врагам
+            # Проверка попадания по врагам (убитых убирает Game.update)
             hits = 0
             for enemy in enemies:
-                if attack_rect.colliderect(enemy.rect):
+                if enemy.health > 0 and attack_rect.colliderect(enemy.rect):
+                    event_log.log(EventLog.HIT, enemy.net_id, SWORD_DAMAGE)
+                    if self.sounds:
+                        self.sounds.play("hit")
+                    if self.particles:
+                        contact = attack_rect.clip(enemy.rect).center
+                        self.particles.emit(*contact, 40, 7, 18, ParticleSystem.SPARKS,
+                                            0 if self.facing_right else math.pi, math.pi)
                     if enemy.take_damage(SWORD_DAMAGE):
-                        enemy.kill()
                         hits += 1
             return hits
         return 0
@@ -466,9 +847,14 @@ class Player(Entity):
             self.health = max(0, self.health - amount)
             self.invincible = INVINCIBILITY_DURATION
             self.current_state = PlayerState.HURT
-            self.animations[PlayerState.HURT].reset()
+            self.start_animation(PlayerState.HURT)
             self.hurt_timer = 15
             self.velocity_y = -8  # Отбрасывание
+            event_log.log(EventLog.DAMAGE, amount, self.health)
+            if self.sounds:
+                self.sounds.play("hurt")
+            if self.particles:
+                self.particles.emit(*self.rect.center, 30, 4, 25, ParticleSystem.BLOOD)
             
             # Отталкивание в зависимости от позиции
             if self.rect.centerx < SCREEN_WIDTH // 2:
@@ -479,36 +865,43 @@ class Player(Entity):
             return self.health <= 0
         return False
     
-    def draw_health(self, surface: pygame.Surface) -> None:
+    def draw_health(self, surface: pygame.Surface, y: int = 10) -> None:
         health_width = 100
         health_height = 12
-        outline_rect = pygame.Rect(10, 10, health_width, health_height)
-        fill_rect = pygame.Rect(10, 10, health_width * (self.health / self.max_health), health_height)
+        outline_rect = pygame.Rect(10, y, health_width, health_height)
+        fill_rect = pygame.Rect(10, y, health_width * (self.health / self.max_health), health_height)
         
         pygame.draw.rect(surface, HEALTH_RED, outline_rect, 2)
         pygame.draw.rect(surface, HEALTH_GREEN, fill_rect)
         
         # Эффект повреждения
         if self.hurt_timer > 0 and self.hurt_timer % 4 < 2:
-            flash_rect = pygame.Rect(10, 10, health_width, health_height)
+            flash_rect = pygame.Rect(10, y, health_width, health_height)
             pygame.draw.rect(surface, (255, 255, 255, 100), flash_rect)
 
 class Enemy(Entity):
-    def __init__(self, x: int, y: int):
-        super().__init__(x, y, 50, 60)
-        self.animation = self._create_animation()
-        self.image = self.animation.get_current_frame()
+    # Кадры у всех врагов одинаковые — общая таблица на класс
+    _animation: Optional[Animation] = None
+    
+    def __init__(self, x: int, y: int, clock: Optional[AnimationClock] = None):
+        super().__init__(x, y, 50, 60, clock)
+        if Enemy._animation is None:
+            Enemy._animation = self._create_animation()
+        self.animation = Enemy._animation
         self.direction = random.choice([-1, 1])
+        self.anim_phase = random.uniform(0, len(self.animation.frames))
+        self.update_image()
         self.speed = random.uniform(*ENEMY_SPEED_RANGE)
         self.health = ENEMY_HEALTH
         self.max_health = ENEMY_HEALTH
         self.damage = 15
         self.attack_cooldown = 0
+        self.net_id = 0
     
     def _create_animation(self) -> Animation:
         frames = []
         for i in range(4):
-            frame = pygame.Surface((50, 60), pygame.SRCALPHA)
+            frame = surface_tracker.track(pygame.Surface((50, 60), pygame.SRCALPHA), "animation")
             # Тело
             pygame.draw.ellipse(frame, (200, 70, 70), (5, 15, 40, 35))
             # Голова
@@ -522,36 +915,51 @@ class Enemy(Entity):
             frames.append(frame)
         return Animation(frames, 0.15)
     
-    def update(self, platforms: pygame.sprite.Group) -> None:
-        self.animation.update()
-        self.image = self.animation.get_current_frame()
-        
-        if self.direction < 0:
-            self.image = pygame.transform.flip(self.image, True, False)
+    def update(self, platforms: pygame.sprite.Group, nav: Optional["NavGraph"] = None,
+               targets: Optional[List[Entity]] = None, dt: float = 1.0) -> None:
+        # Преследование ближайшего игрока по готовой таблице маршрутов
+        follow_edge = False
+        if nav and targets and self.is_standing():
+            target = min(targets, key=lambda t: abs(t.rect.centerx - self.rect.centerx) +
+                         abs(t.rect.bottom - self.rect.bottom))
+            plan = None
+            if target.platform:
+                plan = nav.steer(self.platform, self.rect.centerx, self.speed * dt,
+                                 target.platform, target.rect.centerx)
+            if plan:
+                self.direction, jump, follow_edge = plan
+                if jump:
+                    self.velocity_y = JUMP_STRENGTH
+                    self.on_ground = False
         
         # Горизонтальное движение
-        self.rect.x += self.direction * self.speed
+        step = self.speed * dt
+        self.rect.x += self.direction * step
         
         # Гравитация и коллизии
-        self.apply_gravity()
+        self.apply_gravity(dt)
         self.check_platform_collision(platforms)
         
-        # Изменение направления
-        if self.on_ground:
+        # Изменение направления (не разворачиваемся, если маршрут ведёт с края)
+        if self.on_ground and not follow_edge:
             at_edge = False
-            for platform in platforms:
-                if self.rect.colliderect(platform.rect):
-                    if (self.direction > 0 and not platform.rect.collidepoint(self.rect.right+5, self.rect.bottom+5)) or \
-                       (self.direction < 0 and not platform.rect.collidepoint(self.rect.left-5, self.rect.bottom+5)):
-                        at_edge = True
-                        break
+            # Заглядываем вперёд не меньше, чем враг пройдёт за шаг
+            ahead = max(5, step)
+            platform = self.platform
+            if platform is not None:
+                if (self.direction > 0 and not platform.rect.collidepoint(self.rect.right+ahead, self.rect.bottom+5)) or \
+                   (self.direction < 0 and not platform.rect.collidepoint(self.rect.left-ahead, self.rect.bottom+5)):
+                    at_edge = True
             
             if at_edge or self.rect.left < 0 or self.rect.right > SCREEN_WIDTH:
                 self.direction *= -1
         
         # КД атаки
         if self.attack_cooldown > 0:
-            self.attack_cooldown -= 1
+            self.attack_cooldown = max(0, self.attack_cooldown - dt)
+    
+    def update_image(self) -> None:
+        self.show_frame(self.animation, flipped=self.direction < 0)
     
     def take_damage(self, amount: int) -> bool:
         self.health = max(0, self.health - amount)
@@ -576,24 +984,37 @@ class Enemy(Entity):
             pygame.draw.rect(surface, HEALTH_GREEN, fill_rect)
 
 class Platform(pygame.sprite.Sprite):
+    # Текстуры общие для платформ одного размера и типа
+    _textures: Dict[Tuple[int, int, bool], pygame.Surface] = {}
+    
     def __init__(self, x: int, y: int, width: int, height: int, is_ground: bool = False):
         super().__init__()
-        self.image = pygame.Surface((width, height))
+        self.image = self._texture(width, height, is_ground)
+        self.rect = self.image.get_rect(topleft=(x, y))
+        self.is_ground = is_ground
+    
+    @classmethod
+    def _texture(cls, width: int, height: int, is_ground: bool) -> pygame.Surface:
+        key = (width, height, is_ground)
+        texture = cls._textures.get(key)
+        if texture is not None:
+            return texture
+        
+        texture = surface_tracker.track(pygame.Surface((width, height)), "background")
         if is_ground:
             # Текстура земли
-            self.image.fill((90, 60, 40))
+            texture.fill((90, 60, 40))
             for i in range(0, width, 20):
-                pygame.draw.line(self.image, (110, 80, 50), (i, 0), (i, height), 2)
+                pygame.draw.line(texture, (110, 80, 50), (i, 0), (i, height), 2)
             for i in range(0, height, 20):
-                pygame.draw.line(self.image, (110, 80, 50), (0, i), (width, i), 2)
+                pygame.draw.line(texture, (110, 80, 50), (0, i), (width, i), 2)
         else:
             # Текстура платформы
-            self.image.fill((120, 80, 50))
-            pygame.draw.rect(self.image, (140, 100, 60), (0, 0, width, 5))
-            pygame.draw.rect(self.image, (100, 60, 30), (0, 5, width, height-5))
-        
-        self.rect = self.image.get_rect(topleft=(x, y))
-        self.is_ground = is_ground
+            texture.fill((120, 80, 50))
+            pygame.draw.rect(texture, (140, 100, 60), (0, 0, width, 5))
+            pygame.draw.rect(texture, (100, 60, 30), (0, 5, width, height-5))
+        cls._textures[key] = texture
+        return texture
 
 class WorldGenerator:
     @staticmethod
@@ -654,37 +1075,1421 @@ class WorldGenerator:
         
         return platforms
 
-class Game:
+class SoundBank:
+    # Имя эффекта: (приоритет, длительность в секундах)
+    EFFECTS = {
+        "hit": (2, 0.09),
+        "jump": (1, 0.16),
+        "hurt": (3, 0.25),
+        "enemy_death": (2, 0.35),
+    }
+    SYNTH_VERSION = 1  # Увеличить при изменении синтеза, чтобы сбросить кэш
+    
+    def __init__(self, cache_dir: Optional[str] = SOUND_CACHE_DIR):
+        self.cache_dir = cache_dir  # None — синтезировать без кэша на диске
+        self.loaded = False
+        self.lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+        self.sounds: Dict[str, Tuple[pygame.mixer.Sound, int, int]] = {}
+        self.channels: List[pygame.mixer.Channel] = []
+        self.voice_priority: List[int] = []
+        self.voice_end: List[int] = []
+    
+    def preload(self) -> None:
+        # Из меню: готовим звук в фоне, чтобы load() в начале забега ничего не делал
+        if self.loaded or self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self.load, name="sound-preload", daemon=True)
+        self.thread.start()
+    
+    def load(self) -> None:
+        # Микшер и эффекты готовим один раз; если идёт фоновая загрузка — дожидаемся её
+        with self.lock:
+            if self.loaded:
+                return
+            try:
+                self._load()
+            finally:
+                self.loaded = True
+    
+    def _load(self) -> None:
+        if not init_subsystem("mixer"):
+            return  # Без звука — play() ничего не делает
+        mixer_params = pygame.mixer.get_init()
+        cache_dir = self.cache_dir
+        
+        pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), SOUND_CHANNELS))
+        pygame.mixer.set_reserved(SOUND_CHANNELS)
+        self.channels = [pygame.mixer.Channel(i) for i in range(SOUND_CHANNELS)]
+        self.voice_priority = [0] * SOUND_CHANNELS
+        self.voice_end = [0] * SOUND_CHANNELS
+        
+        sounds = {}
+        for name, (priority, duration) in self.EFFECTS.items():
+            samples = self._load_samples(name, duration, mixer_params, cache_dir)
+            sound = pygame.sndarray.make_sound(samples)
+            sound.set_volume(SOUND_VOLUME)
+            sounds[name] = (sound, priority, int(sound.get_length() * 1000))
+        # Публикуем одним присваиванием: до этого play() просто молчит
+        self.sounds = sounds
+    
+    def _load_samples(self, name: str, duration: float, mixer_params: tuple,
+                      cache_dir: Optional[str]) -> np.ndarray:
+        freq, size, channels = mixer_params
+        path = None
+        if cache_dir is not None:
+            path = os.path.join(
+                cache_dir, f"{name}_{freq}_{size}_{channels}_v{self.SYNTH_VERSION}.npy")
+            try:
+                return np.load(path)
+            except (OSError, ValueError):
+                pass
+        
+        t = np.arange(int(freq * duration), dtype=np.float32) / freq
+        wave = np.clip(getattr(self, f"_synth_{name}")(t, duration), -1.0, 1.0)
+        samples = self._to_mixer_format(wave, size, channels)
+        if path is None:
+            return samples
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.save(path, samples)
+        except OSError:
+            pass  # Кэш — не обязателен
+        return samples
+    
+    @staticmethod
+    def _to_mixer_format(wave: np.ndarray, size: int, channels: int) -> np.ndarray:
+        if size == 32:
+            samples = wave.astype(np.float32)
+        else:
+            bits = abs(size)
+            amplitude = 2 ** (bits - 1) - 1
+            if size < 0:
+                samples = (wave * amplitude).astype(np.int16 if bits == 16 else np.int8)
+            else:
+                samples = (wave * amplitude + amplitude + 1).astype(np.uint16 if bits == 16 else np.uint8)
+        if channels > 1:
+            samples = np.ascontiguousarray(np.repeat(samples[:, None], channels, axis=1))
+        return samples
+    
+    @staticmethod
+    def _envelope(t: np.ndarray, duration: float, attack: float = 0.005) -> np.ndarray:
+        return np.minimum(t / attack, 1.0) * (1.0 - t / duration) ** 2
+    
+    def _synth_hit(self, t: np.ndarray, duration: float) -> np.ndarray:
+        # Звон клинка и короткий шумовой удар
+        rng = np.random.default_rng(1)
+        ring = np.sin(2 * np.pi * 1250 * t) * 0.5 + np.sin(2 * np.pi * 1870 * t) * 0.3
+        noise = rng.uniform(-1, 1, t.size) * np.exp(-t * 60)
+        return (ring + noise) * self._envelope(t, duration) * 0.8
+    
+    def _synth_jump(self, t: np.ndarray, duration: float) -> np.ndarray:
+        # Восходящий свип
+        freq = 280 + 520 * t / duration
+        phase = 2 * np.pi * np.cumsum(freq) / (t.size / duration)
+        return np.sign(np.sin(phase)) * 0.35 * self._envelope(t, duration)
+    
+    def _synth_hurt(self, t: np.ndarray, duration: float) -> np.ndarray:
+        # Нисходящий свип с хрипом
+        rng = np.random.default_rng(2)
+        freq = 420 - 300 * t / duration
+        phase = 2 * np.pi * np.cumsum(freq) / (t.size / duration)
+        wave = np.sin(phase) * 0.7 + rng.uniform(-1, 1, t.size) * 0.2
+        return wave * self._envelope(t, duration)
+    
+    def _synth_enemy_death(self, t: np.ndarray, duration: float) -> np.ndarray:
+        # Низкий "пуф" из шума и падающего тона
+        rng = np.random.default_rng(3)
+        freq = 200 - 150 * t / duration
+        phase = 2 * np.pi * np.cumsum(freq) / (t.size / duration)
+        noise = np.convolve(rng.uniform(-1, 1, t.size), np.ones(8) / 8, mode="same")
+        return (np.sin(phase) * 0.6 + noise * 0.8) * self._envelope(t, duration, 0.01)
+    
+    def play(self, name: str) -> None:
+        entry = self.sounds.get(name)
+        if entry is None:
+            return
+        sound, priority, length = entry
+        
+        # Свободный канал, иначе крадём самый неважный и самый старый голос
+        now = get_ticks()
+        best = -1
+        best_key = None
+        for i in range(len(self.channels)):
+            if self.voice_end[i] <= now:
+                best = i
+                break
+            key = (self.voice_priority[i], self.voice_end[i])
+            if self.voice_priority[i] <= priority and (best_key is None or key < best_key):
+                best = i
+                best_key = key
+        if best < 0:
+            return
+        
+        self.channels[best].play(sound)
+        self.voice_priority[best] = priority
+        self.voice_end[best] = now + length
+
+class ParticleSystem:
+    PALETTE = [
+        (255, 245, 200), (255, 210, 90), (230, 230, 180),  # Искры клинка
+        (255, 60, 60), (190, 30, 30), (255, 140, 140),     # Урон игроку
+        (200, 70, 70), (150, 150, 150), (90, 40, 40),      # Гибель врага
+    ]
+    SPARKS = (0, 1, 2)
+    BLOOD = (3, 4, 5)
+    SMOKE = (6, 7, 8)
+    
+    def __init__(self, capacity: int = PARTICLE_CAPACITY):
+        self.capacity = capacity
+        self.pos = np.zeros((capacity, 2), dtype=np.float32)
+        self.vel = np.zeros((capacity, 2), dtype=np.float32)
+        self.life = np.zeros(capacity, dtype=np.float32)
+        self.color = np.zeros(capacity, dtype=np.uint8)
+        self.rng = np.random.default_rng()
+        self.density = 1.0  # Множитель размера вспышек (задаёт регулятор качества)
+        self._mapped_colors = None
+        self._mapped_format = None
+    
+    @property
+    def live_count(self) -> int:
+        return int(np.count_nonzero(self.life > 0))
+    
+    def emit(self, x: float, y: float, count: int, speed: float, life: float,
+             colors: Tuple[int, ...], angle: float = -math.pi / 2,
+             spread: float = 2 * math.pi) -> None:
+        # Новые частицы занимают только мёртвые слоты
+        slots = np.flatnonzero(self.life <= 0)[:int(count * self.density)]
+        n = slots.size
+        if n == 0:
+            return
+        
+        angles = angle + (self.rng.random(n, dtype=np.float32) - 0.5) * spread
+        speeds = speed * (0.3 + 0.7 * self.rng.random(n, dtype=np.float32))
+        self.pos[slots, 0] = x
+        self.pos[slots, 1] = y
+        self.vel[slots, 0] = np.cos(angles) * speeds
+        self.vel[slots, 1] = np.sin(angles) * speeds
+        self.life[slots] = life * (0.6 + 0.4 * self.rng.random(n, dtype=np.float32))
+        self.color[slots] = self.rng.choice(np.array(colors, dtype=np.uint8), n)
+    
+    def update(self, dt: float = 1.0) -> None:
+        alive = self.life > 0
+        self.vel[:, 1] += PARTICLE_GRAVITY * dt
+        self.pos += self.vel * dt
+        self.life -= dt
+        # Ушедшие за экран гасим сразу
+        self.life[alive & (self.pos[:, 1] > SCREEN_HEIGHT)] = 0
+    
+    def clear(self) -> None:
+        self.life[:] = 0
+    
+    def draw(self, surface: pygame.Surface) -> None:
+        idx = np.flatnonzero(self.life > 0)
+        if idx.size == 0:
+            return
+        
+        width, height = surface.get_size()
+        xs = self.pos[idx, 0].astype(np.int32)
+        ys = self.pos[idx, 1].astype(np.int32)
+        visible = (xs >= 0) & (xs < width - 1) & (ys >= 0) & (ys < height - 1)
+        xs, ys, idx = xs[visible], ys[visible], idx[visible]
+        
+        if surface.get_bytesize() != 4:
+            # Редкий случай: не 32-битная поверхность, рисуем по одной
+            for x, y, c in zip(xs, ys, self.color[idx]):
+                surface.fill(self.PALETTE[c], (int(x), int(y), 2, 2))
+            return
+        
+        # Цвета палитры переводим в формат поверхности один раз
+        surface_format = (surface.get_bitsize(), surface.get_masks())
+        if self._mapped_format != surface_format:
+            self._mapped_colors = np.array(
+                [surface.map_rgb(c) for c in self.PALETTE], dtype=np.uint32)
+            self._mapped_format = surface_format
+        colors = self._mapped_colors[self.color[idx]]
+        
+        # Квадраты 2x2 пишем прямо в пиксели
+        pixels = pygame.surfarray.pixels2d(surface)
+        pixels[xs, ys] = colors
+        pixels[xs + 1, ys] = colors
+        pixels[xs, ys + 1] = colors
+        pixels[xs + 1, ys + 1] = colors
+        del pixels
+
+class QualityGovernor:
+    # Уровни: 0 — полное качество, каждый следующий добавляет упрощение
+    LEVEL_NAMES = [
+        "полное",
+        "без сглаживания текста и полосок врагов",
+        "половина частиц",
+        "без сортировки по глубине, четверть частиц",
+    ]
+    
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.level = 0
+        self.samples = deque(maxlen=QUALITY_WINDOW)
+        self.cooldown = 0
+        self.headroom_frames = 0
+        self.changes = 0
+    
+    @property
+    def max_level(self) -> int:
+        return len(self.LEVEL_NAMES) - 1
+    
+    @property
+    def text_antialias(self) -> bool:
+        return self.level < 1
+    
+    @property
+    def enemy_health_bars(self) -> bool:
+        return self.level < 1
+    
+    @property
+    def particle_density(self) -> float:
+        return (1.0, 1.0, 0.5, 0.25)[self.level]
+    
+    @property
+    def depth_sort(self) -> bool:
+        return self.level < 3
+    
+    @property
+    def average_frame_time(self) -> float:
+        return sum(self.samples) / len(self.samples) if self.samples else 0.0
+    
+    def record(self, frame_time: float) -> None:
+        self.samples.append(frame_time)
+        if self.cooldown > 0:
+            self.cooldown -= 1
+            return
+        if len(self.samples) < QUALITY_WINDOW:
+            return
+        
+        average = self.average_frame_time
+        if average > self.budget * QUALITY_DOWN_RATIO:
+            self.headroom_frames = 0
+            if self.level < self.max_level:
+                self._set_level(self.level + 1)
+        elif average < self.budget * QUALITY_UP_RATIO:
+            # Повышаем только после долгого запаса, чтобы не мигать уровнями
+            self.headroom_frames += 1
+            if self.headroom_frames >= QUALITY_UP_DELAY and self.level > 0:
+                self._set_level(self.level - 1)
+        else:
+            self.headroom_frames = 0
+    
+    def _set_level(self, level: int) -> None:
+        self.level = level
+        self.changes += 1
+        self.cooldown = QUALITY_COOLDOWN
+        self.headroom_frames = 0
+        self.samples.clear()
+
+class NavLink(NamedTuple):
+    target: int
+    kind: str  # "walk" — сойти с края, "jump" — прыжок
+    launch_x: float
+    direction: int
+    cost: float
+
+class NavGraph:
+    WIDTH, HEIGHT = 50, 60  # Размер врага
+    
+    def __init__(self, platforms: pygame.sprite.Group):
+        self.platforms: List[Platform] = list(platforms)
+        self.index: Dict[Platform, int] = {p: i for i, p in enumerate(self.platforms)}
+        self.speed_range = ENEMY_SPEED_RANGE
+        self.jump_profile = self._fall_profile(JUMP_STRENGTH)
+        self.drop_profile = self._fall_profile(0.0)
+        self.links: List[Dict[int, NavLink]] = [self._links_from(i) for i in range(len(self.platforms))]
+        self.next_hop = self._build_next_hop()
+    
+    @staticmethod
+    def _fall_profile(velocity: float) -> Tuple[List[float], int]:
+        # Смещение низа по тикам, так же как в Entity.apply_gravity
+        offsets = [0.0]
+        y = 0.0
+        while y < SCREEN_HEIGHT:
+            velocity += GRAVITY
+            y += velocity
+            offsets.append(y)
+        apex = offsets.index(min(offsets))
+        return offsets, apex
+    
+    @staticmethod
+    def _crossing_tick(profile: Tuple[List[float], int], level: float) -> Optional[int]:
+        # Первый тик на спуске, когда низ пересекает уровень level
+        offsets, apex = profile
+        if level < offsets[apex]:
+            return None
+        tick = bisect.bisect_left(offsets, level, apex)
+        return tick if tick < len(offsets) else None
+    
+    def _landing(self, source: int, launch_x: float, direction: int, speed: float,
+                 profile: Tuple[List[float], int]) -> Optional[Tuple[int, int]]:
+        top = self.platforms[source].rect.top
+        best = None
+        for i, platform in enumerate(self.platforms):
+            tick = self._crossing_tick(profile, platform.rect.top - top)
+            if tick is None or tick == 0:
+                continue
+            x = launch_x + direction * speed * tick
+            if (x + self.WIDTH / 2 > platform.rect.left and
+                    x - self.WIDTH / 2 < platform.rect.right and
+                    (best is None or tick < best[1])):
+                best = (i, tick)
+        return best
+    
+    def _links_from(self, source: int) -> Dict[int, NavLink]:
+        rect = self.platforms[source].rect
+        half = self.WIDTH / 2
+        slow, fast = self.speed_range
+        links: Dict[int, NavLink] = {}
+        
+        candidates = []
+        for direction in (-1, 1):
+            # Шаг с края
+            edge_x = rect.right + half + 1 if direction > 0 else rect.left - half - 1
+            candidates.append(("walk", edge_x, direction, self.drop_profile))
+            # Прыжки из точек вдоль платформы
+            x = rect.left + half
+            while x <= rect.right - half:
+                candidates.append(("jump", x, direction, self.jump_profile))
+                x += NAV_LAUNCH_STEP
+            candidates.append(("jump", rect.right - half, direction, self.jump_profile))
+        
+        for kind, launch_x, direction, profile in candidates:
+            # Ребро годится, только если при любой скорости врага приземление одно и то же
+            landing = self._landing(source, launch_x, direction, slow, profile)
+            if landing is None or landing[0] == source:
+                continue
+            fast_landing = self._landing(source, launch_x, direction, fast, profile)
+            if fast_landing is None or fast_landing[0] != landing[0]:
+                continue
+            target, air_ticks = landing
+            cost = air_ticks + abs(launch_x - rect.centerx) / slow
+            if target not in links or cost < links[target].cost:
+                links[target] = NavLink(target, kind, launch_x, direction, cost)
+        return links
+    
+    def _build_next_hop(self) -> List[List[Optional[NavLink]]]:
+        # Флойд — Уоршелл с восстановлением первого шага маршрута
+        n = len(self.platforms)
+        dist = [[math.inf] * n for _ in range(n)]
+        hop: List[List[Optional[NavLink]]] = [[None] * n for _ in range(n)]
+        for i in range(n):
+            dist[i][i] = 0.0
+            for j, link in self.links[i].items():
+                dist[i][j] = link.cost
+                hop[i][j] = link
+        for k in range(n):
+            dist_k = dist[k]
+            for i in range(n):
+                dist_ik = dist[i][k]
+                if dist_ik == math.inf:
+                    continue
+                dist_i, hop_i = dist[i], hop[i]
+                for j in range(n):
+                    if dist_ik + dist_k[j] < dist_i[j]:
+                        dist_i[j] = dist_ik + dist_k[j]
+                        hop_i[j] = hop_i[k]
+        return hop
+    
+    def steer(self, platform: "Platform", x: float, speed: float,
+              target_platform: "Platform", target_x: float) -> Optional[Tuple[int, bool, bool]]:
+        # Возвращает (направление, прыгать ли, можно ли сходить с края)
+        source = self.index.get(platform)
+        target = self.index.get(target_platform)
+        if source is None or target is None:
+            return None
+        if source == target:
+            if abs(target_x - x) <= speed:
+                return None
+            return (1 if target_x > x else -1), False, False
+        
+        link = self.next_hop[source][target]
+        if link is None:
+            return None
+        if link.kind == "walk":
+            return link.direction, False, True
+        if abs(link.launch_x - x) <= speed:
+            return link.direction, True, True
+        return (1 if link.launch_x > x else -1), False, False
+
+class SpawnDirector:
+    def __init__(self, platforms: pygame.sprite.Group):
+        # Точки появления (левый x, правый x, y) считаются один раз на мир
+        self.spawn_points = [
+            (p.rect.left + 30, p.rect.right - 30, p.rect.y - 50)
+            for p in platforms
+            if not p.is_ground and p.rect.y < SCREEN_HEIGHT - 150
+        ]
+        self.reset()
+    
+    def reset(self) -> None:
+        self.wave = 0
+        self._start_wave()
+    
+    def _start_wave(self) -> None:
+        self.wave += 1
+        self.budget = WAVE_BASE_BUDGET + (self.wave - 1) * WAVE_BUDGET_GROWTH
+        self.interval = max(SPAWN_INTERVAL_MIN, SPAWN_INTERVAL - 2 * (self.wave - 1))
+        self.cooldown = 0
+    
+    def update(self, roster: int, dt: float = 1.0) -> Optional[Tuple[int, int]]:
+        # Не больше одного врага за тик — волна растягивается во времени
+        if self.cooldown > 0:
+            self.cooldown -= dt
+            return None
+        if self.budget == 0:
+            # Волна закончилась, когда всех её врагов победили
+            if roster == 0:
+                self._start_wave()
+                self.cooldown = WAVE_DELAY
+            return None
+        if roster >= MAX_ENEMIES or not self.spawn_points:
+            return None
+        
+        self.budget -= 1
+        self.cooldown = self.interval
+        left, right, y = random.choice(self.spawn_points)
+        return random.randint(left, right), y
+
+class Leaderboard:
+    SCHEMA_VERSION = 1
+    
+    def __init__(self, path: str = LEADERBOARD_PATH):
+        self.path = path
+        self.queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        # Кэш для экрана рекордов; None — база ещё открывается
+        self.top: Optional[List[Tuple[int, float, int, float]]] = None
+        self.total_runs = 0
+        self.error: Optional[str] = None
+        # Открытие и миграция базы — тоже в фоновом потоке
+        self.thread = threading.Thread(target=self._worker, name="leaderboard", daemon=True)
+        self.thread.start()
+    
+    def record_run(self, score: int, duration: float, seed: int, settings: Dict) -> None:
+        # Из игрового потока — только постановка в очередь
+        self.queue.put((time.time(), score, duration, seed, json.dumps(settings, sort_keys=True)))
+    
+    def close(self, timeout: float = 2.0) -> None:
+        self.queue.put(None)
+        self.thread.join(timeout)
+    
+    def _open(self) -> "sqlite3.Connection":
+        import sqlite3  # Только в фоновом потоке, не на пути к первому кадру
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS runs ("
+                    "id INTEGER PRIMARY KEY, played_at REAL NOT NULL, score INTEGER NOT NULL, "
+                    "duration REAL NOT NULL, seed INTEGER NOT NULL, settings TEXT NOT NULL)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_score ON runs (score DESC, duration DESC)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_played_at ON runs (played_at)")
+                conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        return conn
+    
+    def _refresh(self, conn: "sqlite3.Connection") -> None:
+        self.top = conn.execute(
+            "SELECT score, duration, seed, played_at FROM runs "
+            "ORDER BY score DESC, duration DESC LIMIT ?", (LEADERBOARD_SIZE,)).fetchall()
+        self.total_runs = conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+    
+    def _worker(self) -> None:
+        import sqlite3
+        try:
+            conn = self._open()
+            self._refresh(conn)
+        except sqlite3.Error as e:
+            self.error = str(e)
+            self.top = []
+            conn = None
+        
+        while True:
+            batch = [self.queue.get()]
+            # Всё, что успело накопиться, пишем одной транзакцией
+            while len(batch) < LEADERBOARD_BATCH:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [item for item in batch if item is not None]
+            if rows and conn is not None:
+                try:
+                    with conn:
+                        conn.executemany(
+                            "INSERT INTO runs (played_at, score, duration, seed, settings) "
+                            "VALUES (?, ?, ?, ?, ?)", rows)
+                    self._refresh(conn)
+                except sqlite3.Error as e:
+                    self.error = str(e)
+            if len(rows) < len(batch):
+                break
+        
+        if conn is not None:
+            conn.close()
+
+class NetStats:
     def __init__(self):
+        self.sent_bytes = deque(maxlen=NET_STATS_WINDOW)
+        self.received_bytes = deque(maxlen=NET_STATS_WINDOW)
+        self.encode_us = deque(maxlen=NET_STATS_WINDOW)
+        self.decode_us = deque(maxlen=NET_STATS_WINDOW)
+        self.full_bytes = deque(maxlen=NET_STATS_WINDOW)  # Размер полного снимка для сравнения
+    
+    @staticmethod
+    def _mean(values: deque) -> float:
+        return sum(values) / len(values) if values else 0.0
+    
+    def report(self) -> List[str]:
+        lines = [f"Сеть: отправка {self._mean(self.sent_bytes):.0f} Б/тик, "
+                 f"приём {self._mean(self.received_bytes):.0f} Б/тик"]
+        if self.encode_us:
+            lines.append(f"  кодирование {self._mean(self.encode_us):.0f} мкс, "
+                         f"полный снимок {self._mean(self.full_bytes):.0f} Б")
+        if self.decode_us:
+            lines.append(f"  декодирование {self._mean(self.decode_us):.0f} мкс")
+        return lines
+
+class SnapshotCodec:
+    # Заголовок: тип, тик, базовый тик (0 — полный снимок), последний ввод клиента, счёт, состояние
+    HEADER = struct.Struct("<cIIIIB")
+    PLAYER_FIELDS = struct.Struct("<hhhBBB")  # x, y, скорость*8, здоровье, состояние, флаги
+    ENEMY_FULL = struct.Struct("<HhhB")  # id, x, y, (здоровье << 1) | направление
+    
+    @staticmethod
+    def _quantize(value: float) -> int:
+        return max(-32768, min(32767, int(round(value))))
+    
+    @classmethod
+    def capture(cls, game: "Game") -> dict:
+        q = cls._quantize
+        players = []
+        for player in game.players:
+            flags = (player.facing_right | player.on_ground << 1 | player.is_attacking << 2)
+            players.append((q(player.rect.x), q(player.rect.y), q(player.velocity_y * 8),
+                            int(player.health), player.current_state.value, flags))
+        enemies = {
+            enemy.net_id: (q(enemy.rect.x), q(enemy.rect.y), 1 if enemy.direction > 0 else 0, int(enemy.health))
+            for enemy in game.enemies
+        }
+        return {"score": game.score, "state": game.state.value, "players": players, "enemies": enemies}
+    
+    @classmethod
+    def encode(cls, tick: int, base_tick: int, base: Optional[dict], current: dict,
+               last_input: int) -> bytes:
+        out = bytearray(cls.HEADER.pack(b"S", tick, base_tick if base else 0, last_input,
+                                        current["score"], current["state"]))
+        
+        # Игроки: байт-маска изменившихся полей и только эти поля
+        base_players = base["players"] if base else []
+        out.append(len(current["players"]))
+        for i, record in enumerate(current["players"]):
+            old = base_players[i] if i < len(base_players) else None
+            mask = 0
+            for bit, value in enumerate(record):
+                if old is None or old[bit] != value:
+                    mask |= 1 << bit
+            out.append(mask)
+            fields = cls.PLAYER_FIELDS.format[1:]
+            for bit, value in enumerate(record):
+                if mask & (1 << bit):
+                    out += struct.pack("<" + fields[bit], value)
+        
+        base_enemies = base["enemies"] if base else {}
+        enemies = current["enemies"]
+        removed = [i for i in base_enemies if i not in enemies]
+        added = sorted(i for i in enemies if i not in base_enemies)
+        kept = sorted(i for i in enemies if i in base_enemies)
+        
+        out += struct.pack("<H", len(removed))
+        for enemy_id in removed:
+            out += struct.pack("<H", enemy_id)
+        out += struct.pack("<H", len(added))
+        for enemy_id in added:
+            x, y, direction, health = enemies[enemy_id]
+            out += cls.ENEMY_FULL.pack(enemy_id, x, y, health << 1 | direction)
+        
+        # Оставшиеся враги: по 4 бита на каждого, два на байт
+        # (биты 0-1: позиция — нет / дельта int8 / абсолютная int16, бит 2: направление, бит 3: здоровье)
+        masks = []
+        payload = bytearray()
+        for enemy_id in kept:
+            x, y, direction, health = enemies[enemy_id]
+            ox, oy, odirection, ohealth = base_enemies[enemy_id]
+            dx, dy = x - ox, y - oy
+            mask = 0
+            if dx or dy:
+                if -128 <= dx < 128 and -128 <= dy < 128:
+                    mask = 1
+                    payload += struct.pack("<bb", dx, dy)
+                else:
+                    mask = 2
+                    payload += struct.pack("<hh", x, y)
+            if direction != odirection:
+                mask |= 4
+            if health != ohealth:
+                mask |= 8
+                payload.append(health)
+            masks.append(mask)
+        if len(masks) % 2:
+            masks.append(0)
+        out += bytes(masks[i] | masks[i + 1] << 4 for i in range(0, len(masks), 2))
+        out += payload
+        return bytes(out)
+    
+    @classmethod
+    def decode(cls, data: bytes, snapshots: Dict[int, dict]) -> Optional[Tuple[int, int, dict]]:
+        # Возвращает (тик, последний ввод клиента, снимок) или None, если базы нет
+        _, tick, base_tick, last_input, score, state = cls.HEADER.unpack_from(data)
+        base = None
+        if base_tick:
+            base = snapshots.get(base_tick)
+            if base is None:
+                return None
+        offset = cls.HEADER.size
+        
+        base_players = base["players"] if base else []
+        fields = cls.PLAYER_FIELDS.format[1:]
+        players = []
+        count = data[offset]
+        offset += 1
+        for i in range(count):
+            mask = data[offset]
+            offset += 1
+            old = base_players[i] if i < len(base_players) else (0,) * len(fields)
+            record = []
+            for bit, code in enumerate(fields):
+                if mask & (1 << bit):
+                    value, = struct.unpack_from("<" + code, data, offset)
+                    offset += struct.calcsize(code)
+                    record.append(value)
+                else:
+                    record.append(old[bit])
+            players.append(tuple(record))
+        
+        enemies = dict(base["enemies"]) if base else {}
+        removed, = struct.unpack_from("<H", data, offset)
+        offset += 2
+        for _ in range(removed):
+            enemy_id, = struct.unpack_from("<H", data, offset)
+            offset += 2
+            enemies.pop(enemy_id, None)
+        kept = sorted(enemies)
+        
+        added, = struct.unpack_from("<H", data, offset)
+        offset += 2
+        for _ in range(added):
+            enemy_id, x, y, packed = cls.ENEMY_FULL.unpack_from(data, offset)
+            offset += cls.ENEMY_FULL.size
+            enemies[enemy_id] = (x, y, packed & 1, packed >> 1)
+        
+        mask_bytes = (len(kept) + 1) // 2
+        masks = []
+        for byte in data[offset:offset + mask_bytes]:
+            masks += [byte & 0x0F, byte >> 4]
+        offset += mask_bytes
+        for enemy_id, mask in zip(kept, masks):
+            x, y, direction, health = enemies[enemy_id]
+            if mask & 3 == 1:
+                dx, dy = struct.unpack_from("<bb", data, offset)
+                offset += 2
+                x, y = x + dx, y + dy
+            elif mask & 3 == 2:
+                x, y = struct.unpack_from("<hh", data, offset)
+                offset += 4
+            if mask & 4:
+                direction ^= 1
+            if mask & 8:
+                health = data[offset]
+                offset += 1
+            enemies[enemy_id] = (x, y, direction, health)
+        
+        return tick, last_input, {"score": score, "state": state, "players": players, "enemies": enemies}
+
+class NetSession:
+    is_client = False
+    
+    def __init__(self, address: Tuple[str, int]):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.address = address
+        self.stats = NetStats()
+        self.tick = 0
+    
+    def _receive(self) -> List[Tuple[bytes, Tuple[str, int]]]:
+        packets = []
+        while True:
+            try:
+                packets.append(self.sock.recvfrom(65535))
+            except (BlockingIOError, ConnectionResetError):
+                return packets
+    
+    def _send(self, data: bytes, address: Tuple[str, int]) -> None:
+        try:
+            self.sock.sendto(data, address)
+        except OSError:
+            pass  # Потерю пакета переживёт следующий тик
+    
+    @staticmethod
+    def keys_from_bits(bits: int) -> Dict[int, int]:
+        return {K_a: bits & 1, K_d: bits >> 1 & 1, K_w: bits >> 2 & 1}
+    
+    def close(self) -> None:
+        self.sock.close()
+
+class NetHost(NetSession):
+    def __init__(self, port: int = NET_PORT, bind: str = "0.0.0.0"):
+        super().__init__((bind, port))
+        self.sock.bind(self.address)
+        self.client: Optional[Tuple[str, int]] = None
+        self.last_heard = 0.0
+        self.history: Dict[int, dict] = {}
+        self.acked_tick = 0
+        self.pending_inputs: Dict[int, int] = {}
+        self.last_applied = 0
+        self.last_bits = 0
+    
+    def next_input(self) -> Tuple[Dict[int, int], bool]:
+        # Ввод второго игрока: строго по порядку, с догоном при накоплении
+        newest = max(self.pending_inputs, default=self.last_applied)
+        if newest - self.last_applied > NET_INPUT_BUFFER:
+            self.last_applied = newest - NET_INPUT_BUFFER
+        bits = self.pending_inputs.pop(self.last_applied + 1, None)
+        if bits is None:
+            # Ввод не пришёл — держим те же клавиши, без атаки
+            return self.keys_from_bits(self.last_bits), False
+        self.last_applied += 1
+        self.last_bits = bits
+        for seq in [seq for seq in self.pending_inputs if seq <= self.last_applied]:
+            del self.pending_inputs[seq]
+        return self.keys_from_bits(bits), bool(bits & 8)
+    
+    def update(self, game: "Game") -> None:
+        received = 0
+        for data, address in self._receive():
+            received += len(data)
+            kind = data[:1]
+            if address == self.client:
+                self.last_heard = time.perf_counter()
+            elif self.client is not None and time.perf_counter() - self.last_heard < NET_CLIENT_TIMEOUT:
+                continue  # Чужие пакеты, пока текущий клиент на связи
+            if kind == b"H":
+                # Новый клиент: сообщаем сид мира и заводим второго кота
+                if self.client != address:
+                    self.client = address
+                    self.last_heard = time.perf_counter()
+                    self.history.clear()
+                    self.acked_tick = 0
+                    self.pending_inputs.clear()
+                    self.last_applied = 0
+                    game.add_remote_player()
+                self._send(b"W" + struct.pack("<I", game.seed), address)
+            elif kind == b"I" and address == self.client:
+                try:
+                    ack, newest, count = struct.unpack_from("<IIB", data, 1)
+                except struct.error:
+                    continue  # Обрезанный пакет
+                if ack in self.history:
+                    self.acked_tick = max(self.acked_tick, ack)
+                for i, bits in enumerate(data[10:10 + count]):
+                    seq = newest - count + 1 + i
+                    if seq > self.last_applied:
+                        self.pending_inputs[seq] = bits
+        self.stats.received_bytes.append(received)
+        
+        if self.client is None:
+            return
+        self.tick += 1
+        current = SnapshotCodec.capture(game)
+        start = time.perf_counter()
+        # Дельта от последнего снимка, который клиент подтвердил
+        base = self.history.get(self.acked_tick)
+        packet = SnapshotCodec.encode(self.tick, self.acked_tick, base, current, self.last_applied)
+        self.stats.encode_us.append((time.perf_counter() - start) * 1e6)
+        # Полный снимок для статистики — только изредка, чтобы не кодировать дважды каждый тик
+        if base is None:
+            self.stats.full_bytes.append(len(packet))
+        elif self.tick % NET_FULL_SAMPLE_INTERVAL == 0:
+            self.stats.full_bytes.append(len(SnapshotCodec.encode(self.tick, 0, None, current, self.last_applied)))
+        self._send(packet, self.client)
+        self.stats.sent_bytes.append(len(packet))
+        
+        self.history[self.tick] = current
+        self.history.pop(self.tick - NET_SNAPSHOT_HISTORY, None)
+
+class NetClient(NetSession):
+    is_client = True
+    
+    def __init__(self, address: Tuple[str, int]):
+        # Адрес хоста сравнивается с отправителем пакетов, поэтому сразу в виде IP
+        super().__init__((socket.gethostbyname(address[0]), address[1]))
+        self.connected = False
+        self.last_hello = 0.0
+        self.snapshots: Dict[int, dict] = {}
+        self.last_tick = 0
+        self.input_seq = 0
+        self.inputs: Dict[int, int] = {}
+        self.predicted: Dict[int, Tuple[int, int]] = {}  # seq -> позиция после предсказания
+        self.corrections = 0
+        self.snapshot = None
+        self.host_state: Optional[GameState] = None
+    
+    def next_input(self) -> Tuple[Dict[int, int], bool]:
+        return self.keys_from_bits(0), False
+    
+    def update(self, game: "Game") -> None:
+        if not self.connected and time.perf_counter() - self.last_hello > NET_HELLO_INTERVAL:
+            self.last_hello = time.perf_counter()
+            self._send(b"H", self.address)
+        
+        received = 0
+        newest = None
+        for data, address in self._receive():
+            received += len(data)
+            if address != self.address:
+                continue
+            kind = data[:1]
+            if kind == b"W" and not self.connected and len(data) >= 5:
+                seed, = struct.unpack_from("<I", data, 1)
+                self.connected = True
+                game.sounds.load()
+                game.generate_world(seed)
+                game.add_remote_player()
+                game.start_game()
+            elif kind == b"S" and self.connected:
+                start = time.perf_counter()
+                try:
+                    decoded = SnapshotCodec.decode(data, self.snapshots)
+                except (struct.error, IndexError):
+                    continue  # Обрезанный или испорченный снимок
+                self.stats.decode_us.append((time.perf_counter() - start) * 1e6)
+                if decoded is None:
+                    continue
+                tick, last_input, snapshot = decoded
+                if tick <= self.last_tick - NET_SNAPSHOT_HISTORY:
+                    continue  # Опоздавший снимок уже не пригодится как база
+                self.snapshots[tick] = snapshot
+                if tick > self.last_tick:
+                    self.last_tick = tick
+                    newest = (last_input, snapshot)
+        # При потерях и перестановках пакетов точного «tick - N» может не быть — чистим всё старое
+        oldest = self.last_tick - NET_SNAPSHOT_HISTORY
+        for tick in [tick for tick in self.snapshots if tick <= oldest]:
+            del self.snapshots[tick]
+        self.stats.received_bytes.append(received)
+        if not self.connected:
+            return
+        
+        if newest:
+            self._apply(game, *newest)
+        if game.state != GameState.PLAYING:
+            return
+        
+        # Свой ввод: отправляем хосту и сразу применяем локально
+        keys = game.input.keys
+        attack = any(event.type == KEYDOWN and event.key == K_SPACE for event in game.input.events)
+        bits = (keys[K_a] and 1) | (keys[K_d] and 2) | (keys[K_w] and 4) | (attack and 8)
+        self.input_seq += 1
+        self.inputs[self.input_seq] = bits
+        recent = [self.inputs.get(seq, 0) for seq in
+                  range(max(1, self.input_seq - NET_INPUT_REDUNDANCY + 1), self.input_seq + 1)]
+        packet = b"I" + struct.pack("<IIB", self.last_tick, self.input_seq, len(recent)) + bytes(recent)
+        self._send(packet, self.address)
+        self.stats.sent_bytes.append(len(packet))
+        
+        game.player.update(game.platforms, self.keys_from_bits(bits))
+        self.predicted[self.input_seq] = game.player.rect.topleft
+        game.particles.update()
+    
+    def _apply(self, game: "Game", last_input: int, snapshot: dict) -> None:
+        self.snapshot = snapshot
+        game.score = snapshot["score"]
+        state = GameState(snapshot["state"])
+        # Следуем только за переходами хоста: выход клиента в меню после поражения
+        # не должен откатываться следующим же снимком с тем же GAME_OVER
+        if state != self.host_state:
+            if state == GameState.PLAYING and self.host_state not in (None, GameState.PLAYING, GameState.PAUSE):
+                game.start_game()
+            if state != game.state and state in (GameState.PLAYING, GameState.PAUSE, GameState.GAME_OVER):
+                game.state = state
+            self.host_state = state
+        
+        # Кот хоста — как есть, без предсказания
+        if snapshot["players"]:
+            self._set_player(game.remote_player, snapshot["players"][0])
+        
+        # Свой кот: сверка с хостом и повтор неподтверждённых вводов
+        if len(snapshot["players"]) > 1:
+            record = snapshot["players"][1]
+            if self.predicted.get(last_input) != (record[0], record[1]):
+                self.corrections += 1
+            self._set_player(game.player, record)
+            sounds, particles = game.player.sounds, game.player.particles
+            game.player.sounds = game.player.particles = None
+            for seq in range(last_input + 1, self.input_seq + 1):
+                game.player.update(game.platforms, self.keys_from_bits(self.inputs.get(seq, 0)))
+                self.predicted[seq] = game.player.rect.topleft
+            game.player.sounds, game.player.particles = sounds, particles
+            for seq in [seq for seq in self.inputs if seq <= last_input]:
+                del self.inputs[seq]
+                self.predicted.pop(seq, None)
+        
+        # Враги: заводим новых, убираем пропавших, обновляем остальных
+        by_id = {enemy.net_id: enemy for enemy in game.enemies}
+        for enemy_id, enemy in by_id.items():
+            if enemy_id not in snapshot["enemies"]:
+                # Враги пропадают из снимка только при гибели
+                enemy.kill()
+                game.sounds.play("enemy_death")
+                game.particles.emit(*enemy.rect.center, 120, 5, 40, ParticleSystem.SMOKE)
+        for enemy_id, (x, y, direction, health) in snapshot["enemies"].items():
+            enemy = by_id.get(enemy_id)
+            if enemy is None:
+                enemy = Enemy(x, y, game.animation_clock)
+                enemy.net_id = enemy_id
+                game.all_sprites.add(enemy)
+                game.enemies.add(enemy)
+            enemy.rect.topleft = (x, y)
+            enemy.direction = 1 if direction else -1
+            enemy.health = health
+    
+    @staticmethod
+    def _set_player(player: Player, record: tuple) -> None:
+        x, y, velocity, health, state, flags = record
+        player.rect.topleft = (x, y)
+        player.prev_bottom = player.rect.bottom
+        player.velocity_y = velocity / 8
+        player.health = health
+        state = PlayerState(state)
+        if state != player.current_state:
+            # Разовые анимации на клиенте отсчитываем от прихода снимка
+            player.start_animation(state)
+        player.current_state = state
+        player.facing_right = bool(flags & 1)
+        player.on_ground = bool(flags & 2)
+        player.is_attacking = bool(flags & 4)
+
+class ProfileCapture:
+    def __init__(self, directory: str = PROFILE_DIR, frames: int = PROFILE_FRAMES):
+        self.directory = directory
+        self.frames = frames
+        self.profiler: "Optional[cProfile.Profile]" = None
+        self.frames_left = 0
+        self.frames_captured = 0
+        self.tags: Dict[str, object] = {}
+        self.started = ""
+        self.frame_open = False  # Профилировщик включён в текущем кадре
+        self.last_report: Optional[str] = None
+        self.error: Optional[str] = None
+    
+    @property
+    def active(self) -> bool:
+        return self.profiler is not None
+    
+    def toggle(self, tags: Dict[str, object]) -> None:
+        if self.active:
+            self.stop(tags)
+        else:
+            self.start(tags)
+    
+    def start(self, tags: Dict[str, object]) -> None:
+        self.tags = dict(tags)
+        self.started = time.strftime("%Y%m%d_%H%M%S")
+        self.frames_left = self.frames
+        self.frames_captured = 0
+        # Включится с началом следующего кадра; модуль нужен только здесь
+        import cProfile
+        self.profiler = cProfile.Profile()
+    
+    def begin_frame(self) -> None:
+        # Профилируем только работу кадра, без ожидания темпа
+        if self.active:
+            self.profiler.enable()
+            self.frame_open = True
+    
+    def frame_done(self, tags: Dict[str, object]) -> None:
+        # Кадр, в котором захват только включили по F9, не профилировался и не считается
+        if not self.frame_open:
+            return
+        self.frame_open = False
+        self.profiler.disable()
+        self.frames_captured += 1
+        self.frames_left -= 1
+        if self.frames_left <= 0:
+            self.stop(tags)
+    
+    def stop(self, tags: Dict[str, object]) -> Optional[str]:
+        if not self.active:
+            return None
+        self.profiler.disable()
+        self.frame_open = False
+        profiler, self.profiler = self.profiler, None
+        
+        base = os.path.join(self.directory, f"profile_{self.started}_{self.tags.get('state', 'UNKNOWN')}")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profiler.dump_stats(base + ".prof")
+        except OSError as e:
+            # Некуда писать — теряем захват, но не игру
+            self.error = f"не удалось сохранить профиль: {e}"
+            print(self.error, file=sys.stderr)
+            return None
+        
+        # Текстовая сводка: метки захвата и топ функций по накопленному времени
+        stream = io.StringIO()
+        stream.write(f"Захват: {self.started}, кадров: {self.frames_captured}\n")
+        for key, value in self.tags.items():
+            end_value = tags.get(key, value)
+            stream.write(f"{key}: {value}" + (f" -> {end_value}" if end_value != value else "") + "\n")
+        stream.write("\n")
+        import pstats
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_TOP)
+        try:
+            with open(base + ".txt", "w", encoding="utf-8") as f:
+                f.write(stream.getvalue())
+        except OSError as e:
+            self.error = f"не удалось сохранить сводку: {e}"
+            print(self.error, file=sys.stderr)
+            return None
+        
+        self.error = None
+        self.last_report = base + ".txt"
+        return self.last_report
+
+class FrameRecorder:
+    def __init__(self, directory: str = CAPTURE_DIR, buffers: int = CAPTURE_BUFFERS,
+                 frame_step: int = CAPTURE_FRAME_STEP):
+        self.directory = directory
+        self.buffer_count = buffers
+        self.frame_step = frame_step
+        # Пул создаётся при первом захвате — под размер и формат экрана
+        self.buffers: List[np.ndarray] = []
+        self.free: "queue.Queue[int]" = queue.Queue()
+        self.jobs: "queue.Queue[Optional[Tuple[int, List[str]]]]" = queue.Queue()
+        self.thread: Optional[threading.Thread] = None
+        self.shifts: Tuple[int, ...] = (16, 8, 0)
+        self.clip_dir: Optional[str] = None
+        self.clip_frames = 0
+        self.clip_countdown = 0  # Кадров игры до следующего кадра ролика
+        self.screenshot_pending = False
+        self.captured = 0
+        self.dropped = 0
+        self.last_saved: Optional[str] = None
+    
+    @property
+    def recording(self) -> bool:
+        return self.clip_dir is not None
+    
+    def toggle_recording(self) -> None:
+        if self.recording:
+            self.clip_dir = None
+        else:
+            self.clip_dir = os.path.join(self.directory, time.strftime("clip_%Y%m%d_%H%M%S"))
+            self.clip_frames = 0
+            self.clip_countdown = 0
+    
+    def request_screenshot(self) -> None:
+        self.screenshot_pending = True
+    
+    def capture(self, screen: pygame.Surface) -> None:
+        # Вызывается после отрисовки и до flip: не больше одного копирования за кадр,
+        # даже если кадр нужен и для снимка, и для ролика
+        # Пропущенный кадр ничего не сдвигает: снимок и кадр ролика берутся со следующего
+        paths = []
+        if self.screenshot_pending:
+            paths.append(os.path.join(self.directory, time.strftime("screenshot_%Y%m%d_%H%M%S")
+                                      + f"_{self.captured:05d}.png"))
+        clip_due = False
+        if self.recording:
+            self.clip_countdown -= 1
+            if self.clip_countdown <= 0:
+                clip_due = True
+                paths.append(os.path.join(self.clip_dir, f"frame_{self.clip_frames:05d}.png"))
+        if not paths or not self._submit(screen, paths):
+            return
+        self.screenshot_pending = False
+        if clip_due:
+            # Номера кадров ролика идут без дыр — так их читает ffmpeg по шаблону %05d
+            self.clip_frames += 1
+            self.clip_countdown = self.frame_step
+    
+    def _submit(self, screen: pygame.Surface, paths: List[str]) -> bool:
+        if not self.buffers:
+            self._allocate(screen)
+        try:
+            index = self.free.get_nowait()
+        except queue.Empty:
+            # Кодировщик не успевает — пропускаем кадр, а не тормозим игру
+            self.dropped += 1
+            return False
+        # Пиксели экрана хранятся построчно: транспонированный вид копируется одним memcpy
+        pixels = pygame.surfarray.pixels2d(screen)
+        np.copyto(self.buffers[index], pixels.T)
+        del pixels
+        self.captured += 1
+        self.jobs.put((index, paths))
+        return True
+    
+    def _allocate(self, screen: pygame.Surface) -> None:
+        width, height = screen.get_size()
+        self.buffers = [np.empty((height, width), dtype=np.uint32) for _ in range(self.buffer_count)]
+        for index in range(self.buffer_count):
+            self.free.put(index)
+        self.shifts = tuple(screen.get_shifts()[:3])
+        self.thread = threading.Thread(target=self._worker, name="frame-recorder", daemon=True)
+        self.thread.start()
+    
+    def _worker(self) -> None:
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            index, paths = job
+            try:
+                rows = self._png_rows(self.buffers[index])
+                self.free.put(index)
+                index = None
+                data = self._encode_png(rows)
+                for path in paths:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(path, "wb") as f:
+                        f.write(data)
+                    self.last_saved = path
+            except Exception as e:
+                # Поток кодировщика не должен умирать: иначе close() повиснет на очереди
+                print(f"Не удалось сохранить кадр {', '.join(paths)}: {e}", file=sys.stderr)
+            finally:
+                if index is not None:
+                    self.free.put(index)
+                self.jobs.task_done()
+    
+    def _png_rows(self, buffer: np.ndarray) -> np.ndarray:
+        # Строки PNG: байт фильтра (0) и RGB-тройки; NumPy отпускает GIL на копиях
+        height, width = buffer.shape
+        rows = np.zeros((height, 1 + width * 3), dtype=np.uint8)
+        rgb = rows[:, 1:].reshape(height, width, 3)
+        for channel, shift in enumerate(self.shifts):
+            rgb[..., channel] = buffer >> shift
+        return rows
+    
+    @staticmethod
+    def _encode_png(rows: np.ndarray) -> bytes:
+        # pygame.image.save держит GIL всё время кодирования и останавливает игру,
+        # а zlib на больших буферах его отпускает
+        def chunk(tag: bytes, data: bytes) -> bytes:
+            return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+        height, width = rows.shape[0], (rows.shape[1] - 1) // 3
+        header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+        return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+                + chunk(b"IDAT", zlib.compress(rows, CAPTURE_COMPRESSION)) + chunk(b"IEND", b""))
+    
+    def close(self) -> None:
+        # Дописываем очередь до конца, чтобы ролик не обрывался
+        self.clip_dir = None
+        if self.thread is None:
+            return
+        self.jobs.join()
+        self.jobs.put(None)
+        self.thread.join()
+        self.thread = None
+
+class InputSystem:
+    def __init__(self):
+        self.pending: List[pygame.event.Event] = []
+        self.events: List[pygame.event.Event] = []
+        self.keys = pygame.key.get_pressed()
+        self.latencies = deque(maxlen=LATENCY_HISTORY)  # мс от события до flip
+        self._frame_inputs: List[int] = []
+    
+    def collect(self) -> None:
+        # Забираем события из очереди SDL и помечаем временем прихода
+        now = time.perf_counter_ns()
+        for event in pygame.event.get():
+            event.stamp = now
+            self.pending.append(event)
+    
+    def sample(self) -> List[pygame.event.Event]:
+        # Снимок ввода как можно позже — прямо перед шагом симуляции
+        self.collect()
+        self.events, self.pending = self.pending, []
+        self.keys = pygame.key.get_pressed()
+        self._frame_inputs = [event.stamp for event in self.events
+                              if event.type in (KEYDOWN, MOUSEBUTTONDOWN)]
+        return self.events
+    
+    def frame_presented(self, flip_ns: int) -> None:
+        # Кадр с реакцией на ввод показан — фиксируем задержку
+        for stamp in self._frame_inputs:
+            self.latencies.append((flip_ns - stamp) / 1_000_000)
+        self._frame_inputs = []
+    
+    def latency_stats(self) -> Dict[str, float]:
+        if not self.latencies:
+            return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+        values = sorted(self.latencies)
+        return {
+            "count": len(values),
+            "mean": sum(values) / len(values),
+            "p50": values[len(values) // 2],
+            "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+            "max": values[-1]
+        }
+    
+    def dump_latencies(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("sample,latency_ms\n")
+            for i, latency in enumerate(self.latencies):
+                f.write(f"{i},{latency:.3f}\n")
+
+class FramePacer:
+    def __init__(self, fps: int, mode: str = FRAME_PACING):
+        self.fps = fps
+        self.mode = mode
+        self.frame_time = 1.0 / fps
+        self.clock = pygame.time.Clock()
+        self.deadline = time.perf_counter()
+        self.last_tick = self.deadline
+    
+    def wait(self, idle: Optional[Callable] = None) -> None:
+        if self.mode == "tick":
+            # Та же задержка, что у clock.tick, но сон порезан на миллисекунды,
+            # чтобы события получали метку прихода, а не метку сэмплирования
+            if idle:
+                target = self.last_tick + self.frame_time
+                while target - time.perf_counter() > 0.001:
+                    time.sleep(0.001)
+                    idle()
+            self.clock.tick(self.fps)
+            self.last_tick = time.perf_counter()
+            return
+        
+        self.deadline += self.frame_time
+        now = time.perf_counter()
+        if now >= self.deadline:
+            # Кадр не уложился в бюджет — не пытаемся догонять
+            self.deadline = now
+        else:
+            # Спим короткими отрезками, пока далеко до дедлайна
+            if self.mode == "precise":
+                while self.deadline - time.perf_counter() > BUSY_WAIT_MARGIN:
+                    time.sleep(0.001)
+                    if idle:
+                        idle()
+            # Остаток дожидаемся активно
+            while time.perf_counter() < self.deadline:
+                if idle:
+                    idle()
+        # Только для статистики FPS, без задержки
+        self.clock.tick()
+
+class Game:
+    def __init__(self, leaderboard_path: str = LEADERBOARD_PATH, analytics: bool = ANALYTICS_ENABLED,
+                 sound_cache: Optional[str] = SOUND_CACHE_DIR):
+        self.startup = StartupTimer()
+        if analytics:
+            event_log.start()
+        init_subsystem("display")
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption("Knight Cat Adventure")
-        self.clock = pygame.time.Clock()
-        self.font = pygame.font.SysFont('Arial', 28, bold=True)
-        self.title_font = pygame.font.SysFont('Arial', 72, bold=True)
-        self.button_font = pygame.font.SysFont('Arial', 32, bold=True)
+        self.pacer = FramePacer(FPS)
+        self.clock = self.pacer.clock
+        self.input = InputSystem()
+        self.startup.mark("display")
+        
+        self.font = get_font('Arial', 28, bold=True)
+        self.title_font = get_font('Arial', 72, bold=True)
+        self.button_font = get_font('Arial', 32, bold=True)
+        self.debug_font = get_font('Consolas', 16)
+        self.startup.mark("fonts")
+        
+        # Звук и мир понадобятся только в игре — см. start_game
+        self.sounds = SoundBank(sound_cache)
+        self.particles = ParticleSystem()
+        self.quality = QualityGovernor(1.0 / FPS)
+        self.show_debug = False
+        self.leaderboard = Leaderboard(leaderboard_path)
+        self.profile_capture = ProfileCapture()
+        self.recorder = FrameRecorder()
+        self.platforms: Optional[pygame.sprite.Group] = None
+        self.static_layer: Optional[pygame.Surface] = None
+        self.startup.mark("systems")
         
         # Игровые объекты
         self.background = self._create_forest_background()
         self.menu_background = self._create_menu_background()
-        self.platforms = WorldGenerator.generate()
+        self.startup.mark("backgrounds")
         
-        # Группы спрайтов
+        # Группы спрайтов и часы их анимаций
+        self.animation_clock = AnimationClock()
         self.all_sprites = pygame.sprite.Group()
         self.enemies = pygame.sprite.Group()
         
         # Игрок
-        self.player = Player(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+        self.player = Player(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2, self.sounds, self.particles,
+                             self.animation_clock)
         self.all_sprites.add(self.player)
+        self.startup.mark("player")
+        
+        # Совместная игра: второй кот и сетевая сессия (см. NetHost / NetClient)
+        self.remote_player: Optional[Player] = None
+        self.net: Optional["NetSession"] = None
+        self.next_enemy_id = 1
         
         # Кнопки меню
         self._create_menu_buttons()
+        self.startup.mark("menu")
         
         # Игровые переменные
         self.state = GameState.MAIN_MENU
         self.start_time = 0
+        self.survival_time = 0.0
         self.score = 0
         self.running = True
     
+    @property
+    def state(self) -> GameState:
+        return self._state
+    
+    @state.setter
+    def state(self, value: GameState) -> None:
+        previous = getattr(self, "_state", None)
+        self._state = value
+        if previous is not value:
+            self._on_state_change(previous, value)
+    
+    def _on_state_change(self, previous: Optional[GameState], state: GameState) -> None:
+        surface_tracker.snapshot(state.name)
+        event_log.log(EventLog.STATE, previous.value if previous else 0, state.value)
+    
+    def generate_world(self, seed: Optional[int] = None) -> None:
+        # Сид запоминаем, чтобы забег можно было воспроизвести
+        self.seed = random.randrange(2 ** 31) if seed is None else seed
+        random.seed(self.seed)
+        self.platforms = WorldGenerator.generate()
+        # Граф навигации и точки появления строим один раз на мир
+        self.nav = NavGraph(self.platforms)
+        self.director = SpawnDirector(self.platforms)
+        self.invalidate_static_layer()
+    
+    def invalidate_static_layer(self) -> None:
+        # Пересобрать фон с платформами — только когда меняется мир
+        self.static_layer = None
+    
+    def _build_static_layer(self) -> pygame.Surface:
+        layer = surface_tracker.track(self.background.copy(), "background")
+        self.platforms.draw(layer)
+        return layer
+    
     def _create_menu_buttons(self) -> None:
         button_width, button_height = 300, 60
         x_pos = SCREEN_WIDTH // 2 - button_width // 2
@@ -701,6 +2506,10 @@ class Game:
             x_pos, 510, button_width, button_height,
             "Авторы", self.show_credits
         )
+        self.leaderboard_button = Button(
+            x_pos, 590, button_width, button_height,
+            "Рекорды", self.show_leaderboard
+        )
         self.back_button = Button(
             x_pos, 550, button_width, button_height,
             "Назад", self.show_main_menu
@@ -715,7 +2524,7 @@ class Game:
         )
     
     def _create_forest_background(self) -> pygame.Surface:
-        surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        surface = surface_tracker.track(pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)), "background")
         
         # Градиентное небо
         for y in range(SCREEN_HEIGHT):
@@ -723,6 +2532,7 @@ class Game:
                 max(10, min(40, 20 + y//30)),
                 max(20, min(60, 30 + y//20)),
                 max(30, min(100, 50 + y//10))
+            )
             pygame.draw.line(surface, color, (0, y), (SCREEN_WIDTH, y))
         
         # Дальние деревья
@@ -745,53 +2555,75 @@ class Game:
         return surface
     
     def _create_menu_background(self) -> pygame.Surface:
-        surface = self.background.copy()
+        surface = surface_tracker.track(self.background.copy(), "background")
         
         # Затемнение фона
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+        overlay = surface_tracker.track(pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA), "overlay")
         overlay.fill((0, 0, 0, 150))
         surface.blit(overlay, (0, 0))
         
         # Заголовок игры
-        title_text = self.title_font.render("Knight Cat Adventure", True, TITLE_SHADOW)
+        title_text = surface_tracker.track(self.title_font.render("Knight Cat Adventure", True, TITLE_SHADOW), "text")
         surface.blit(title_text, (SCREEN_WIDTH//2 - title_text.get_width()//2 + 5, 100 + 5))
-        title_text = self.title_font.render("Knight Cat Adventure", True, TITLE_COLOR)
+        title_text = surface_tracker.track(self.title_font.render("Knight Cat Adventure", True, TITLE_COLOR), "text")
         surface.blit(title_text, (SCREEN_WIDTH//2 - title_text.get_width()//2, 100))
         
         return surface
     
-    def spawn_enemies(self) -> None:
-        if len(self.enemies) >= MAX_ENEMIES:
-            return
-            
-        for platform in self.platforms:
-            if (platform.rect.y < SCREEN_HEIGHT - 150 and 
-                random.random() < 0.5 and
-                not platform.is_ground):
-                
-                enemy = Enemy(
-                    random.randint(platform.rect.left + 30, platform.rect.right - 30),
-                    platform.rect.y - 50
-                )
-                self.all_sprites.add(enemy)
-                self.enemies.add(enemy)
+    @property
+    def players(self) -> List[Player]:
+        if self.remote_player is None:
+            return [self.player]
+        return [self.player, self.remote_player]
+    
+    def add_remote_player(self) -> Player:
+        if self.remote_player is None:
+            self.remote_player = Player(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2, self.sounds, self.particles,
+                                        self.animation_clock)
+            self.all_sprites.add(self.remote_player)
+        self._reset_player(self.remote_player, (260, SCREEN_HEIGHT - 200))
+        return self.remote_player
+    
+    def spawn_enemy(self, x: int, y: int) -> Enemy:
+        enemy = Enemy(x, y, self.animation_clock)
+        # Постоянный номер врага для сетевых снимков
+        enemy.net_id = self.next_enemy_id
+        self.next_enemy_id = self.next_enemy_id % 65535 + 1
+        self.all_sprites.add(enemy)
+        self.enemies.add(enemy)
+        event_log.log(EventLog.SPAWN, x, y)
+        return enemy
+    
+    @staticmethod
+    def _reset_player(player: Player, position: Tuple[int, int]) -> None:
+        player.health = player.max_health
+        player.rect.center = position
+        player.prev_bottom = player.rect.bottom
+        player.current_state = PlayerState.IDLE
+        player.velocity_y = 0
+        player.on_ground = False
+        player.platform = None
     
     def start_game(self) -> None:
+        # Первый запуск забега: поднимаем звук и строим мир
+        self.sounds.load()
+        if self.platforms is None:
+            self.generate_world()
+        
         self.state = GameState.PLAYING
-        self.start_time = pygame.time.get_ticks()
+        self.start_time = get_ticks()
         self.score = 0
         
-        # Сброс игрока
-        self.player.health = self.player.max_health
-        self.player.rect.center = (200, SCREEN_HEIGHT - 200)
-        self.player.current_state = PlayerState.IDLE
-        self.player.velocity_y = 0
-        self.player.on_ground = False
+        # Сброс игроков
+        self._reset_player(self.player, (200, SCREEN_HEIGHT - 200))
+        if self.remote_player is not None:
+            self._reset_player(self.remote_player, (260, SCREEN_HEIGHT - 200))
         
         # Сброс врагов
         for enemy in list(self.enemies):
             enemy.kill()
-        self.spawn_enemies()
+        self.particles.clear()
+        self.director.reset()
     
     def resume_game(self) -> None:
         self.state = GameState.PLAYING
@@ -802,6 +2634,20 @@ class Game:
     def show_credits(self) -> None:
         self.state = GameState.CREDITS
     
+    def show_leaderboard(self) -> None:
+        self.state = GameState.LEADERBOARD
+    
+    def end_game(self) -> None:
+        self.state = GameState.GAME_OVER
+        self.survival_time = (get_ticks() - self.start_time) / 1000
+        self.leaderboard.record_run(self.score, self.survival_time, self.seed, {
+            "fps": FPS,
+            "pacing": self.pacer.mode,
+            "quality": self.quality.level,
+            "max_enemies": MAX_ENEMIES,
+            "platforms": len(self.platforms),
+        })
+    
     def show_main_menu(self) -> None:
         self.state = GameState.MAIN_MENU
         self.player.rect.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 100)
@@ -810,9 +2656,17 @@ class Game:
         self.state = GameState.PAUSE
     
     def handle_events(self) -> None:
-        for event in pygame.event.get():
+        for event in self.input.events:
             if event.type == QUIT:
                 self.running = False
+            elif event.type == KEYDOWN and event.key == K_F3:
+                self.show_debug = not self.show_debug
+            elif event.type == KEYDOWN and event.key == K_F9:
+                self.profile_capture.toggle(self.profile_tags())
+            elif event.type == KEYDOWN and event.key == K_F10:
+                self.recorder.toggle_recording()
+            elif event.type == KEYDOWN and event.key == K_F12:
+                self.recorder.request_screenshot()
             
             if self.state == GameState.MAIN_MENU:
                 if self.start_button.handle_event(event):
@@ -821,12 +2675,13 @@ class Game:
                     self.show_settings()
                 elif self.credits_button.handle_event(event):
                     self.show_credits()
+                elif self.leaderboard_button.handle_event(event):
+                    self.show_leaderboard()
             
             elif self.state == GameState.PLAYING:
                 if event.type == KEYDOWN:
                     if event.key == K_SPACE:
-                        hits = self.player.attack(self.enemies)
-                        self.score += hits * ENEMY_SCORE
+                        self.player.attack(self.enemies)
                     elif event.key == K_ESCAPE:
                         self.pause_game()
             
@@ -838,7 +2693,7 @@ class Game:
                 elif self.quit_button.handle_event(event):
                     self.show_main_menu()
             
-            elif self.state in (GameState.SETTINGS, GameState.CREDITS):
+            elif self.state in (GameState.SETTINGS, GameState.CREDITS, GameState.LEADERBOARD):
                 if event.type == KEYDOWN and event.key == K_ESCAPE:
                     self.show_main_menu()
                 elif self.back_button.handle_event(event):
@@ -849,49 +2704,70 @@ class Game:
                     self.show_main_menu()
     
     def update(self) -> None:
-        if self.state != GameState.PLAYING:
+        if self.net and self.net.is_client:
+            # Клиент мир не симулирует: снимки хоста + предсказание своего кота
+            self.animation_clock.advance()
+            self.net.update(self)
             return
-        
-        self.player.update(self.platforms)
-        self.enemies.update(self.platforms)
-        
-        # Удаление мертвых врагов и спавн новых
+        if self.state == GameState.PLAYING:
+            self.simulate()
+        elif self.state == GameState.MAIN_MENU:
+            self.animation_clock.advance()  # Танец кота в меню
+        if self.net:
+            self.net.update(self)
+    
+    def simulate(self, dt: float = 1.0) -> None:
+        self.animation_clock.advance(dt)
+        self.player.update(self.platforms, self.input.keys, dt)
+        if self.remote_player is not None and self.net:
+            keys, attack = self.net.next_input()
+            self.remote_player.update(self.platforms, keys, dt)
+            if attack:
+                self.remote_player.attack(self.enemies)
+        players = self.players
+        self.enemies.update(self.platforms, self.nav, players, dt)
+        self.particles.update(dt)
+        
+        # Удаление мертвых врагов
         for enemy in list(self.enemies):
             if enemy.health <= 0:
                 enemy.kill()
+                event_log.log(EventLog.DEATH, enemy.net_id, self.score + ENEMY_SCORE)
+                self.sounds.play("enemy_death")
+                self.particles.emit(*enemy.rect.center, 120, 5, 40, ParticleSystem.SMOKE)
                 self.score += ENEMY_SCORE
-                # Спавн нового врага с шансом 50%
-                if random.random() < 0.5 and len(self.enemies) < MAX_ENEMIES:
-                    available_platforms = [p for p in self.platforms 
-                                         if not p.is_ground and p.rect.y < SCREEN_HEIGHT - 150]
-                    if available_platforms:
-                        platform = random.choice(available_platforms)
-                        new_enemy = Enemy(
-                            random.randint(platform.rect.left + 30, platform.rect.right - 30),
-                            platform.rect.y - 50
-                        )
-                        self.all_sprites.add(new_enemy)
-                        self.enemies.add(new_enemy)
+        
+        # Спавн новых врагов по плану волны
+        spawn = self.director.update(len(self.enemies), dt)
+        if spawn:
+            self.spawn_enemy(*spawn)
         
         # Проверка столкновений с врагами
-        for enemy in self.enemies:
-            if (pygame.sprite.collide_rect(self.player, enemy) and 
-                self.player.invincible == 0 and
-                self.player.current_state != PlayerState.HURT and
-                enemy.attack_cooldown == 0):
-                
-                if self.player.take_damage(enemy.damage):
-                    enemy.attack_cooldown = 30
-                    if self.player.health <= 0:
-                        self.state = GameState.GAME_OVER
+        for player in players:
+            for enemy in self.enemies:
+                if (pygame.sprite.collide_rect(player, enemy) and 
+                    player.invincible == 0 and
+                    player.current_state != PlayerState.HURT and
+                    enemy.attack_cooldown == 0):
+                    
+                    if player.take_damage(enemy.damage):
+                        enemy.attack_cooldown = 30
+                        if player.health <= 0 and self.state == GameState.PLAYING:
+                            self.end_game()
         
         # Проверка выхода за пределы экрана
-        if self.player.rect.top > SCREEN_HEIGHT:
-            self.state = GameState.GAME_OVER
-        
-        # Спавн новых врагов
-        if random.random() < 0.01 and len(self.enemies) < MAX_ENEMIES:
-            self.spawn_enemies()
+        for player in players:
+            if self.state == GameState.PLAYING and player.rect.top > SCREEN_HEIGHT:
+                self.end_game()
+    
+    def fast_forward(self, ticks: int, step: float = FAST_FORWARD_STEP) -> None:
+        # Пакетная симуляция без отрисовки крупными шагами (повторы, прогоны баланса)
+        remaining = float(ticks)
+        while remaining > 0 and self.state == GameState.PLAYING:
+            dt = min(step, remaining)
+            self.simulate(dt)
+            event_log.flush()  # Кадров нет — сбрасываем журнал по ходу симуляции
+            remaining -= dt
     
     def draw_main_menu(self) -> None:
         self.screen.blit(self.menu_background, (0, 0))
@@ -905,19 +2781,21 @@ class Game:
         self.start_button.check_hover(mouse_pos)
         self.settings_button.check_hover(mouse_pos)
         self.credits_button.check_hover(mouse_pos)
+        self.leaderboard_button.check_hover(mouse_pos)
         
         self.start_button.draw(self.screen)
         self.settings_button.draw(self.screen)
         self.credits_button.draw(self.screen)
+        self.leaderboard_button.draw(self.screen)
     
     def draw_settings(self) -> None:
         self.screen.blit(self.menu_background, (0, 0))
         
-        title = self.title_font.render("Настройки", True, WHITE)
+        title = surface_tracker.track(self.title_font.render("Настройки", True, WHITE), "transient")
         self.screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 100))
         
         # Здесь можно добавить настройки
-        text = self.font.render("Настройки звука и управления", True, WHITE)
+        text = surface_tracker.track(self.font.render("Настройки звука и управления", True, WHITE), "transient")
         self.screen.blit(text, (SCREEN_WIDTH//2 - text.get_width()//2, 200))
         
         # Кнопка назад
@@ -928,14 +2806,14 @@ class Game:
     def draw_credits(self) -> None:
         self.screen.blit(self.menu_background, (0, 0))
         
-        title = self.title_font.render("Авторы", True, WHITE)
+        title = surface_tracker.track(self.title_font.render("Авторы", True, WHITE), "transient")
         self.screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 100))
         
         # Информация об авторах
-        author = self.font.render("Игра создана человеком под ником Nekon2738", True, WHITE)
+        author = surface_tracker.track(self.font.render("Игра создана человеком под ником Nekon2738", True, WHITE), "transient")
         self.screen.blit(author, (SCREEN_WIDTH//2 - author.get_width()//2, 200))
         
-        version = self.font.render("Версия 1.0", True, WHITE)
+        version = surface_tracker.track(self.font.render("Версия 1.0", True, WHITE), "transient")
         self.screen.blit(version, (SCREEN_WIDTH//2 - version.get_width()//2, 250))
         
         # Кнопка назад
@@ -943,13 +2821,37 @@ class Game:
         self.back_button.check_hover(mouse_pos)
         self.back_button.draw(self.screen)
     
+    def draw_leaderboard(self) -> None:
+        self.screen.blit(self.menu_background, (0, 0))
+        
+        title = surface_tracker.track(self.title_font.render("Рекорды", True, WHITE), "transient")
+        self.screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 80))
+        
+        # Только кэш — к базе из игрового потока не обращаемся
+        top = self.leaderboard.top
+        if top is None:
+            lines = ["Загрузка..."]
+        elif not top:
+            lines = ["Пока нет ни одного забега"]
+        else:
+            lines = [f"{i}. {score} очков — {duration:.0f} сек"
+                     for i, (score, duration, _, _) in enumerate(top, 1)]
+        for i, line in enumerate(lines):
+            text = surface_tracker.track(self.font.render(line, True, WHITE), "transient")
+            self.screen.blit(text, (SCREEN_WIDTH//2 - text.get_width()//2, 190 + i * 34))
+        
+        # Кнопка назад
+        mouse_pos = pygame.mouse.get_pos()
+        self.back_button.check_hover(mouse_pos)
+        self.back_button.draw(self.screen)
+    
     def draw_pause_menu(self) -> None:
         # Затемнение игрового экрана
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+        overlay = surface_tracker.track(pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA), "transient")
         overlay.fill((0, 0, 0, 180))
         self.screen.blit(overlay, (0, 0))
         
-        title = self.title_font.render("Пауза", True, WHITE)
+        title = surface_tracker.track(self.title_font.render("Пауза", True, WHITE), "transient")
         self.screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 200))
         
         # Кнопки
@@ -962,48 +2864,103 @@ class Game:
     
     def draw_game_over(self) -> None:
         # Затемнение игрового экрана
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+        overlay = surface_tracker.track(pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA), "transient")
         overlay.fill((0, 0, 0, 200))
         self.screen.blit(overlay, (0, 0))
         
-        title = self.title_font.render("Игра окончена", True, (255, 80, 80))
+        antialias = self.quality.text_antialias
+        title = surface_tracker.track(self.title_font.render("Игра окончена", antialias, (255, 80, 80)), "transient")
         self.screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 200))
         
-        score_text = self.font.render(f"Счет: {self.score}", True, WHITE)
+        score_text = surface_tracker.track(self.font.render(f"Счет: {self.score}", antialias, WHITE), "transient")
         self.screen.blit(score_text, (SCREEN_WIDTH//2 - score_text.get_width()//2, 300))
         
-        time_survived = (pygame.time.get_ticks() - self.start_time) // 1000
-        time_text = self.font.render(f"Время выживания: {time_survived} сек", True, WHITE)
+        time_text = surface_tracker.track(self.font.render(f"Время выживания: {int(self.survival_time)} сек", antialias, WHITE), "transient")
         self.screen.blit(time_text, (SCREEN_WIDTH//2 - time_text.get_width()//2, 350))
         
-        restart_text = self.font.render("Нажмите R для возврата в меню", True, (200, 200, 255))
+        restart_text = surface_tracker.track(self.font.render("Нажмите R для возврата в меню", antialias, (200, 200, 255)), "transient")
         self.screen.blit(restart_text, (SCREEN_WIDTH//2 - restart_text.get_width()//2, 450))
     
     def draw_game(self) -> None:
-        self.screen.blit(self.background, (0, 0))
-        
-        # Отрисовка всех платформ
-        self.platforms.draw(self.screen)
+        # Фон и платформы неподвижны — один блит заранее собранного слоя
+        if self.static_layer is None:
+            self.static_layer = self._build_static_layer()
+        self.screen.blit(self.static_layer, (0, 0))
         
         # Отрисовка всех спрайтов (сортировка по Y для правильного отображения)
-        for sprite in sorted(self.all_sprites, key=lambda x: x.rect.bottom):
+        sprites = self.all_sprites.sprites()
+        if self.quality.depth_sort:
+            sprites.sort(key=lambda x: x.rect.bottom)
+        health_bars = self.quality.enemy_health_bars
+        for sprite in sprites:
+            # Кадр анимации выбирается при отрисовке по часам игры
+            sprite.update_image()
             self.screen.blit(sprite.image, sprite.rect)
-            if isinstance(sprite, Enemy):
+            if health_bars and isinstance(sprite, Enemy):
                 sprite.draw_health(self.screen)
         
-        # Отрисовка здоровья игрока
+        # Частицы эффектов
+        self.particles.draw(self.screen)
+        
+        # Отрисовка здоровья игроков
         self.player.draw_health(self.screen)
+        if self.remote_player is not None:
+            self.remote_player.draw_health(self.screen, 26)
         
         # Отрисовка интерфейса
-        current_time = (pygame.time.get_ticks() - self.start_time) // 1000
-        score_text = self.font.render(f"Счет: {self.score}", True, WHITE)
-        time_text = self.font.render(f"Время: {current_time} сек", True, WHITE)
+        current_time = (get_ticks() - self.start_time) // 1000
+        antialias = self.quality.text_antialias
+        score_text = surface_tracker.track(self.font.render(f"Счет: {self.score}", antialias, WHITE), "transient")
+        time_text = surface_tracker.track(self.font.render(f"Время: {current_time} сек", antialias, WHITE), "transient")
         
         self.screen.blit(score_text, (20, 40))
         self.screen.blit(time_text, (SCREEN_WIDTH - time_text.get_width() - 20, 40))
     
+    def profile_tags(self) -> Dict[str, object]:
+        return {
+            "state": self.state.name,
+            "enemies": len(self.enemies),
+            "platforms": len(self.platforms) if self.platforms is not None else 0,
+            "particles": self.particles.live_count,
+            "quality": self.quality.level,
+        }
+    
+    def debug_lines(self) -> List[str]:
+        latency = self.input.latency_stats()
+        return [
+            f"FPS: {self.clock.get_fps():.1f}",
+            f"Кадр: {self.quality.average_frame_time * 1000:.2f} мс",
+            f"Качество: {self.quality.level} ({QualityGovernor.LEVEL_NAMES[self.quality.level]})",
+            f"Задержка ввода p95: {latency['p95']:.1f} мс",
+            f"Частицы: {self.particles.live_count}",
+            f"Волна: {self.director.wave}, осталось {self.director.budget}, врагов {len(self.enemies)}"
+            if self.platforms is not None else "Мир ещё не создан",
+            *self.startup.report()[:1],
+            *(self.net.stats.report() if self.net else []),
+            (f"Профилирование: осталось {self.profile_capture.frames_left} кадров"
+             if self.profile_capture.active else
+             f"Профиль (F9): {self.profile_capture.error or self.profile_capture.last_report or 'нет'}"),
+            (f"Запись (F10): {self.recorder.clip_frames} кадров, пропущено {self.recorder.dropped}"
+             if self.recorder.recording else
+             f"Снимок (F12): {self.recorder.last_saved or 'нет'}"),
+            *surface_tracker.report(),
+            *surface_tracker.leaks[-3:],
+        ]
+    
+    def draw_debug_overlay(self) -> None:
+        y = SCREEN_HEIGHT - 10
+        for line in reversed(self.debug_lines()):
+            text = surface_tracker.track(self.debug_font.render(line, False, (255, 255, 120), (0, 0, 0)), "transient")
+            y -= text.get_height()
+            self.screen.blit(text, (10, y))
+    
     def run(self) -> None:
         while self.running:
+            # Ждём начала кадра, затем сразу снимаем ввод
+            self.pacer.wait(self.input.collect)
+            frame_start = time.perf_counter()
+            self.profile_capture.begin_frame()
+            self.input.sample()
             self.handle_events()
             self.update()
             
@@ -1013,6 +2970,8 @@ class Game:
                 self.draw_settings()
             elif self.state == GameState.CREDITS:
                 self.draw_credits()
+            elif self.state == GameState.LEADERBOARD:
+                self.draw_leaderboard()
             elif self.state == GameState.PLAYING:
                 self.draw_game()
             elif self.state == GameState.PAUSE:
@@ -1022,12 +2981,121 @@ class Game:
                 self.draw_game()
                 self.draw_game_over()
             
+            if self.show_debug:
+                self.draw_debug_overlay()
+            
+            self.recorder.capture(self.screen)
             pygame.display.flip()
-            self.clock.tick(FPS)
-        
+            self.input.frame_presented(time.perf_counter_ns())
+            surface_tracker.end_frame()
+            self.startup.first_frame()
+            if self.state == GameState.MAIN_MENU:
+                self.sounds.preload()
+            if self.profile_capture.active:
+                self.profile_capture.frame_done(self.profile_tags())
+            
+            # Время работы кадра (без ожидания) — для регулятора качества и журнала
+            frame_time = time.perf_counter() - frame_start
+            self.quality.record(frame_time)
+            event_log.log(EventLog.FRAME, frame_time * 1000, self.quality.level)
+            event_log.flush()
+            self.particles.density = self.quality.particle_density
+        
+        if LATENCY_LOG:
+            self.input.dump_latencies(LATENCY_LOG)
+        if self.profile_capture.active:
+            self.profile_capture.stop(self.profile_tags())
+        event_log.close()
+        self.recorder.close()
+        self.leaderboard.close()
+        if self.net:
+            self.net.close()
         pygame.quit()
         sys.exit()
 
-if __name__ == "__main__":
-    game = Game()
+def run_loopback_test(ticks: int = 600, port: int = NET_PORT + 1) -> bool:
+    # Хост и клиент в одном процессе через UDP на localhost, без окна и звука
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    # Проверка не должна оставлять рекордов и журналов в каталоге игры
+    host = Game(":memory:", analytics=False, sound_cache=None)
+    host.net = NetHost(port, "127.0.0.1")
+    host.start_game()
+    client = Game(":memory:", analytics=False, sound_cache=None)
+    client.net = NetClient(("127.0.0.1", port))
+    host.input.keys = NetSession.keys_from_bits(0)
+    
+    mismatches = 0
+    checked = 0
+    for tick in range(ticks):
+        # Сценарий клиента: вправо, стоим, влево, стоим; прыжки и удары
+        phase = tick // 60 % 4
+        client.input.keys = {K_a: int(phase == 2), K_d: int(phase == 0), K_w: int(tick % 90 == 0)}
+        client.input.events = [pygame.event.Event(KEYDOWN, key=K_SPACE)] if tick % 45 == 0 else []
+        host.input.events = []
+        for player in host.players:
+            player.invincible = INVINCIBILITY_DURATION  # Проверяем сеть, а не выживание
+        
+        host.update()
+        client.update()
+        
+        # Восстановленный клиентом снимок должен совпадать с тем, что хост закодировал
+        if client.net.snapshot is not None:
+            checked += 1
+            if host.net.history.get(client.net.last_tick) != client.net.snapshot:
+                mismatches += 1
+    
+    host_ids = sorted(enemy.net_id for enemy in host.enemies)
+    client_ids = sorted(enemy.net_id for enemy in client.enemies)
+    print(f"Тиков: {ticks}, проверено снимков: {checked}, расхождений: {mismatches}")
+    print(f"Поправок предсказания: {client.net.corrections}")
+    print("\n".join(host.net.stats.report() + client.net.stats.report()))
+    print(f"Враги хоста: {host_ids}")
+    print(f"Враги клиента: {client_ids}")
+    
+    host.net.close()
+    client.net.close()
+    host.leaderboard.close()
+    client.leaderboard.close()
+    return client.net.connected and checked > 0 and mismatches == 0 and host_ids == client_ids
+
+def summarize_events(path: str) -> None:
+    session = EventLog.load_session(path)
+    duration = session["t"][-1] if len(session["t"]) else 0.0
+    print(f"{path}: {len(session['t'])} событий за {duration:.1f} сек")
+    for kind, name in enumerate(EventLog.KINDS):
+        print(f"  {name}: {int(np.count_nonzero(session['kind'] == kind))}")
+    frames = session["a"][session["kind"] == EventLog.FRAME]
+    if len(frames):
+        p50, p95, p99 = np.percentile(frames, [50, 95, 99])
+        print(f"  время кадра: p50 {p50:.2f} мс, p95 {p95:.2f} мс, p99 {p99:.2f} мс")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Knight Cat Adventure")
+    parser.add_argument("--host", action="store_true", help="принимать второго игрока по UDP")
+    parser.add_argument("--join", metavar="АДРЕС[:ПОРТ]", help="подключиться к хосту")
+    parser.add_argument("--port", type=int, default=NET_PORT)
+    parser.add_argument("--loopback-test", action="store_true",
+                        help="прогнать хост и клиента в одном процессе и проверить синхронизацию")
+    parser.add_argument("--analytics", action="store_true", default=ANALYTICS_ENABLED,
+                        help=f"записывать журнал игровых событий в {ANALYTICS_DIR}")
+    parser.add_argument("--events", metavar="ФАЙЛ", help="кратко описать записанный журнал событий")
+    args = parser.parse_args()
+    
+    if args.loopback_test:
+        sys.exit(0 if run_loopback_test() else 1)
+    if args.events:
+        summarize_events(args.events)
+        return
+    
+    game = Game(analytics=args.analytics)
+    if args.host:
+        game.net = NetHost(args.port)
+        game.start_game()
+    elif args.join:
+        address, _, port = args.join.partition(":")
+        game.net = NetClient((address, int(port) if port else args.port))
     game.run()
+
+if __name__ == "__main__":
+    main()